@@ -0,0 +1,79 @@
+import time
+
+from intermediate_code_generator import tac_reads, tac_writes
+from app.instrumentation import PeakMemory
+
+# Longest instruction text of a row (literal lists are cut off)
+INSTR_PREVIEW = 200
+
+
+class InstructionProfiler:
+    """
+    EXPLAIN ANALYZE: per-instruction profile of one Executor.run().
+
+    Installed as executor.profiler, it wraps every instruction and records
+    its wall time, the number of elements it reads and writes, and the
+    memory allocated while it runs (peak above the level before the
+    instruction, via tracemalloc). The result is the optimized TAC
+    annotated with these figures, one row per executed instruction; the
+    instruction text is cut after INSTR_PREVIEW characters.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.rows = []
+
+    def profile(self, executor, instr):
+        """Execute instr on executor and record its row"""
+        elements_in = sum(self.size(executor, v) for v in self.operands(instr))
+
+        if self.trace_memory:
+            memory = PeakMemory()
+
+        failed = True
+        start = time.perf_counter()
+        try:
+            executor.execute(instr)
+            failed = False
+        finally:
+            row = {
+                "step": len(self.rows) + 1,
+                "instr": str(instr)[:INSTR_PREVIEW],
+                "time_ms": (time.perf_counter() - start) * 1000,
+                "elements_in": elements_in,
+                # A failed instruction produced nothing
+                "elements_out": None if failed else sum(self.size(executor, n) for n in tac_writes(instr)),
+            }
+            if self.trace_memory:
+                row["alloc_bytes"] = memory.stop()
+            self.rows.append(row)
+
+    @staticmethod
+    def operands(instr):
+        """Names and literal lists an instruction reads"""
+        return tac_reads(instr) + [v for v in instr[2:] if isinstance(v, list)]
+
+    @staticmethod
+    def size(executor, value):
+        """Element count of a name or literal list (a scalar counts as 1)"""
+        if isinstance(value, str):
+            value = executor.memory.get(value)
+        if isinstance(value, list) or executor.is_list(value):
+            return len(value)
+        return 1
+
+
+def format_plan(rows):
+    """Annotated plan as an aligned text table"""
+    lines = [f"{'step':>4}  {'time_ms':>9}  {'in':>8}  {'out':>8}  {'alloc_bytes':>11}  instruction"]
+
+    for row in rows:
+        out = "-" if row["elements_out"] is None else row["elements_out"]
+        alloc = row.get("alloc_bytes", "-")
+        lines.append(
+            f"{row['step']:>4}  {row['time_ms']:>9.3f}  {row['elements_in']:>8}  {out:>8}  {alloc:>11}  {row['instr']}"
+        )
+
+    total = sum(row["time_ms"] for row in rows)
+    lines.append(f"Total: {total:.3f} ms over {len(rows)} instructions")
+    return "\n".join(lines)
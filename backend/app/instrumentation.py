@@ -0,0 +1,132 @@
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+# Pipeline phases in execution order (same names as error_phase)
+PHASES = ("lexer", "parser", "semantic", "tac", "optimizer", "execution")
+
+# tracemalloc is process wide: it runs while at least one request traces
+# memory, unless it was already enabled (e.g. PYTHONTRACEMALLOC)
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_owns_tracing = False
+_measurements = set()  # PeakMemory objects in progress
+
+
+def start_tracing():
+    """Register one more tracemalloc user (starts tracing for the first)"""
+    global _tracing_users, _owns_tracing
+    with _tracing_lock:
+        if _tracing_users == 0:
+            _owns_tracing = not tracemalloc.is_tracing()
+            if _owns_tracing:
+                tracemalloc.start()
+        _tracing_users += 1
+
+
+def stop_tracing():
+    """Release a start_tracing() registration (the last one stops tracing)"""
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _owns_tracing:
+            tracemalloc.stop()
+
+
+class PeakMemory:
+    """
+    Peak traced memory of a block, above the level when it started.
+
+    tracemalloc keeps one peak for the whole process, which every
+    measurement resets when it starts. Before each reset the peak reached
+    so far is added to all measurements in progress, so nested ones
+    (EXPLAIN ANALYZE inside the execution phase) and those of concurrent
+    requests never lower each other's peak.
+    """
+
+    def __init__(self):
+        start_tracing()
+        with _tracing_lock:
+            peak = tracemalloc.get_traced_memory()[1]
+            for measurement in _measurements:
+                measurement.peak = max(measurement.peak, peak)
+            tracemalloc.reset_peak()
+            self.baseline = self.peak = tracemalloc.get_traced_memory()[0]
+            _measurements.add(self)
+
+    def stop(self):
+        """End the measurement; returns its peak in bytes"""
+        with _tracing_lock:
+            _measurements.discard(self)
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        stop_tracing()
+        return max(0, self.peak - self.baseline)
+
+
+class PhaseProbe:
+    """
+    Measures each phase of one run_lql call.
+
+    Wall time (perf_counter) and CPU time (thread_time, i.e. of the worker
+    running the request) are always recorded: they cost two clock reads per
+    phase. With trace_memory=True the peak memory allocated during every
+    phase is recorded too, through tracemalloc (see PeakMemory). Tracing
+    slows the request down noticeably and its peak is process wide, so with
+    concurrent requests on a thread pool it includes their allocations as
+    well.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.phases = {}          # phase -> {"wall_ms", "cpu_ms"[, "peak_bytes"]}
+        self.opcodes = Counter()  # executed instructions per opcode
+        self.cached = False       # compile phases served by the program cache
+        self.reclaim = None       # values dropped after their last use
+
+    @contextmanager
+    def phase(self, name):
+        """Record wall/CPU time (and peak memory) of the enclosed block"""
+        if self.trace_memory:
+            memory = PeakMemory()
+
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            stats = {
+                "wall_ms": (time.perf_counter() - wall) * 1000,
+                "cpu_ms": (time.thread_time() - cpu) * 1000,
+            }
+            if self.trace_memory:
+                stats["peak_bytes"] = memory.stop()
+            self.phases[name] = stats
+
+    def count_opcodes(self, tac, executed):
+        """Count the opcodes of the first `executed` instructions of tac"""
+        self.opcodes.update(instr[0] for instr in tac[:executed])
+
+    def count_reclaimed(self, executor):
+        """Record what the executor freed through liveness"""
+        liveness = executor.get_liveness()
+        self.reclaim = {
+            "values": liveness.values,
+            "peak_live_values": liveness.peak_live,
+            "freed_values": executor.freed_values,
+            "freed_elements": executor.freed_elements,
+        }
+
+    def report(self) -> dict:
+        """Instrumentation block of the /run response"""
+        return {
+            "cached": self.cached,
+            "phases": self.phases,
+            "total": {
+                "wall_ms": sum(p["wall_ms"] for p in self.phases.values()),
+                "cpu_ms": sum(p["cpu_ms"] for p in self.phases.values()),
+            },
+            "opcodes": dict(self.opcodes),
+            "reclaim": self.reclaim,
+        }
@@ -1,17 +1,40 @@
-from lexer import lex
+from lexer import lex_stream
 from parser import Parser
 from semantic_analyzer import SemanticAnalyzer
 from intermediate_code_generator import TACGenerator
 from optimizer import Optimizer
-from code_executer import Executor
+from code_executer import create_executor
+import bytecode_vm  # registers the "vm" / "vm-array" backends
+import tac_compiler  # registers the "native" backend
+from liveness import analyze_liveness
+from app.program_cache import program_cache, source_key
+from app.instrumentation import PhaseProbe
+from app.explain import InstructionProfiler
 
 import io
-import sys
 
-def run_lql(code: str) -> dict:
+def run_lql(code: str, backend: str = "list", instrument: bool = False,
+            explain_analyze: bool = False) -> dict:
     """
     Runs the full LQL compilation pipeline and returns
     output of every phase for the FastAPI endpoint.
+
+    backend selects the execution backend: "list" (plain Python lists),
+    "array" (NumPy arrays with whole-array kernels), "vm" / "vm-array"
+    (the same storage run as bytecode, see bytecode_vm.py) or "native"
+    (the program compiled into one Python function, see tac_compiler.py).
+
+    Successfully compiled programs are cached by source hash, so a
+    repeated program goes straight to the executor.
+
+    The result carries an "instrumentation" block with the wall and CPU
+    time of every phase that ran, the executed opcodes and the values the
+    executor freed after their last use (see liveness.py); instrument=True
+    also records each phase's peak allocated memory (slower).
+
+    explain_analyze=True adds an "explain_analyze" phase: the optimized
+    TAC annotated with each instruction's time, element counts and
+    allocated bytes (see app/explain.py).
     """
 
     phases = {
@@ -20,86 +43,132 @@ def run_lql(code: str) -> dict:
         "semantic": "",
         "tac": [],
         "optimized_tac": [],
-        "execution_output": "",
     }
+    if explain_analyze:
+        phases["explain_analyze"] = []
+    phases["execution_output"] = ""
 
     error_phase = None
     error_message = None
+    probe = PhaseProbe(trace_memory=instrument)
 
     try:
         # =======================
-        # 1. LEXER
+        # 0. PROGRAM CACHE
         # =======================
-        try:
-            tokens = lex(code)
-            phases["tokens"] = [str(t) for t in tokens]
-        except Exception as e:
-            error_phase = "lexer"
-            error_message = str(e)
-            raise
+        cache_key = source_key(code)
+        cached = program_cache.get(cache_key)
 
-        # =======================
-        # 2. PARSER → AST
-        # =======================
-        try:
-            parser = Parser(tokens)
-            ast = parser.parse()
-            phases["parser"] = [str(node.__dict__) for node in ast]
-        except Exception as e:
-            error_phase = "parser"
-            error_message = str(e)
-            raise
+        if cached is not None:
+            # Compile phases are skipped: reuse their stored output
+            probe.cached = True
+            phases.update(cached["phases"])
+            optimized_tac = cached["tac"]
+            symbol_table = cached["symbols"]
+            entry = cached
+        else:
+            # =======================
+            # 1. LEXER
+            # =======================
+            try:
+                with probe.phase("lexer"):
+                    tokens = lex_stream(code)
+                    phases["tokens"] = tokens.display()
+            except Exception as e:
+                error_phase = "lexer"
+                error_message = str(e)
+                raise
 
-        # =======================
-        # 3. SEMANTIC ANALYSIS
-        # =======================
-        try:
-            sem = SemanticAnalyzer()
-            symbol_table = sem.analyze(ast)
-            phases["semantic"] = str(symbol_table)
-        except Exception as e:
-            error_phase = "semantic"
-            error_message = str(e)
-            raise
+            # =======================
+            # 2. PARSER → AST
+            # =======================
+            try:
+                with probe.phase("parser"):
+                    parser = Parser(tokens)
+                    ast = parser.parse()
+                    phases["parser"] = [str(node.fields()) for node in ast]
+            except Exception as e:
+                error_phase = "parser"
+                error_message = str(e)
+                raise
 
-        # =======================
-        # 4. GENERATE TAC
-        # =======================
-        try:
-            tacgen = TACGenerator()
-            tac = tacgen.generate(ast)
-            phases["tac"] = [str(instr) for instr in tac]
-        except Exception as e:
-            error_phase = "tac"
-            error_message = str(e)
-            raise
+            # =======================
+            # 3. SEMANTIC ANALYSIS
+            # =======================
+            try:
+                with probe.phase("semantic"):
+                    sem = SemanticAnalyzer()
+                    symbol_table = sem.analyze(ast)
+                    phases["semantic"] = str(symbol_table)
+            except Exception as e:
+                error_phase = "semantic"
+                error_message = str(e)
+                raise
 
-        # =======================
-        # 5. OPTIMIZER
-        # =======================
-        try:
-            optimizer = Optimizer(tac)
-            optimized_tac = optimizer.optimize()
-            phases["optimized_tac"] = [str(instr) for instr in optimized_tac]
-        except Exception as e:
-            error_phase = "optimizer"
-            error_message = str(e)
-            raise
+            # =======================
+            # 4. GENERATE TAC
+            # =======================
+            try:
+                with probe.phase("tac"):
+                    tacgen = TACGenerator()
+                    tac = tacgen.generate(ast)
+                    phases["tac"] = [str(instr) for instr in tac]
+            except Exception as e:
+                error_phase = "tac"
+                error_message = str(e)
+                raise
+
+            # =======================
+            # 5. OPTIMIZER
+            # =======================
+            try:
+                with probe.phase("optimizer"):
+                    optimizer = Optimizer(tac)
+                    optimized_tac = optimizer.optimize()
+                    phases["optimized_tac"] = [str(instr) for instr in optimized_tac]
+            except Exception as e:
+                error_phase = "optimizer"
+                error_message = str(e)
+                raise
+
+            entry = {
+                "tac": optimized_tac,
+                "symbols": symbol_table,
+                "types": optimizer.types,
+                # Values are dropped after their last use (see liveness.py)
+                "liveness": analyze_liveness(optimized_tac),
+                "phases": {k: phases[k] for k in ("tokens", "parser", "semantic", "tac", "optimized_tac")},
+            }
+            program_cache.put(cache_key, entry)
 
         # =======================
         # 6. EXECUTION ENGINE
         # =======================
         try:
-            exec_engine = Executor(optimized_tac, symbol_table)
+            # Output goes to a per-request buffer, so concurrent runs never mix
             buffer = io.StringIO()
-            old_stdout = sys.stdout
-            sys.stdout = buffer
-
+            exec_engine = create_executor(optimized_tac, symbol_table, backend, output=buffer)
+            exec_engine.liveness = entry["liveness"]
+            # Static element types select the typed kernels
+            exec_engine.types = entry["types"]
+            program_key = getattr(exec_engine, "program_key", None)
+            if program_key is not None:
+                # Bytecode / generated code is built once and kept with the
+                # cached program, counted in the cache size
+                program = entry.get(program_key)
+                if program is None:
+                    program = program_cache.add(cache_key, program_key, exec_engine.build_program())
+                exec_engine.program = program
+            if explain_analyze:
+                exec_engine.profiler = InstructionProfiler()
             try:
-                exec_engine.run()
+                with probe.phase("execution"):
+                    exec_engine.run()
             finally:
-                sys.stdout = old_stdout
-
+                probe.count_opcodes(optimized_tac, exec_engine.executed)
+                probe.count_reclaimed(exec_engine)
+                if explain_analyze:
+                    phases["explain_analyze"] = exec_engine.profiler.rows
             phases["execution_output"] = buffer.getvalue()
         except Exception as e:
             error_phase = "execution"
@@ -110,7 +179,8 @@ def run_lql(code: str) -> dict:
             "success": True,
             "error": None,
             "error_phase": None,
-            "phases": phases
+            "phases": phases,
+            "instrumentation": probe.report()
         }
 
     except Exception:
@@ -119,5 +189,6 @@ def run_lql(code: str) -> dict:
             "success": False,
             "error": error_message,
             "error_phase": error_phase,
-            "phases": phases
+            "phases": phases,
+            "instrumentation": probe.report()
         }
@@ -0,0 +1,150 @@
+import threading
+
+from app.instrumentation import PHASES
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds (bytes) of the peak memory histogram buckets
+MEMORY_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2, 256 * 1024 ** 2)
+
+
+class Histogram:
+    """Cumulative Prometheus histogram for one label set"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        """Exposition lines: _bucket series (le labels), _sum and _count"""
+        prefix = f"{labels}," if labels else ""
+        out = [
+            f'{name}_bucket{{{prefix}le="{bound}"}} {count}'
+            for bound, count in zip(self.buckets, self.counts)
+        ]
+        out.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        out.append(f"{name}_sum{suffix} {self.sum}")
+        out.append(f"{name}_count{suffix} {self.count}")
+        return out
+
+
+class Metrics:
+    """
+    Thread-safe aggregate of the instrumentation of every /run request,
+    rendered in the Prometheus text exposition format by /metrics.
+
+    Results are recorded by the server from what run_lql returns, so this
+    also works when programs run on a process pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}         # (outcome, error_phase) -> count
+        self.request_latency = Histogram(LATENCY_BUCKETS)
+        self.phase_latency = {}    # phase -> Histogram of wall time
+        self.phase_cpu = {}        # phase -> total CPU seconds
+        self.phase_memory = {}     # phase -> Histogram of peak bytes (traced runs only)
+        self.opcodes = {}          # opcode -> executed instructions
+        self.cache_hits = 0
+        self.freed_values = 0
+        self.freed_elements = 0
+
+    def record(self, result: dict):
+        """Aggregate the instrumentation block of one run_lql result"""
+        outcome = "success" if result["success"] else "error"
+        report = result.get("instrumentation")
+
+        with self._lock:
+            key = (outcome, result["error_phase"] or "")
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if report is None:
+                return
+
+            self.request_latency.observe(report["total"]["wall_ms"] / 1000)
+            self.cache_hits += report["cached"]
+
+            for phase, stats in report["phases"].items():
+                self.phase_latency.setdefault(phase, Histogram(LATENCY_BUCKETS)).observe(stats["wall_ms"] / 1000)
+                self.phase_cpu[phase] = self.phase_cpu.get(phase, 0.0) + stats["cpu_ms"] / 1000
+                if "peak_bytes" in stats:
+                    self.phase_memory.setdefault(phase, Histogram(MEMORY_BUCKETS)).observe(stats["peak_bytes"])
+
+            for opcode, count in report["opcodes"].items():
+                self.opcodes[opcode] = self.opcodes.get(opcode, 0) + count
+
+            if report.get("reclaim"):
+                self.freed_values += report["reclaim"]["freed_values"]
+                self.freed_elements += report["reclaim"]["freed_elements"]
+
+    def record_rejected(self, outcome: str):
+        """Count a request that never produced a result ("busy" / "timeout")"""
+        with self._lock:
+            key = (outcome, "")
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format"""
+        lines = []
+
+        with self._lock:
+            lines.append("# HELP lql_requests_total /run requests by outcome and failing phase.")
+            lines.append("# TYPE lql_requests_total counter")
+            for (outcome, phase), count in sorted(self.requests.items()):
+                lines.append(f'lql_requests_total{{outcome="{outcome}",error_phase="{phase}"}} {count}')
+
+            lines.append("# HELP lql_request_duration_seconds Wall time of run_lql.")
+            lines.append("# TYPE lql_request_duration_seconds histogram")
+            lines.extend(self.request_latency.lines("lql_request_duration_seconds", ""))
+
+            lines.append("# HELP lql_phase_duration_seconds Wall time per compiler phase.")
+            lines.append("# TYPE lql_phase_duration_seconds histogram")
+            for phase in self._phase_order(self.phase_latency):
+                lines.extend(self.phase_latency[phase].lines("lql_phase_duration_seconds", f'phase="{phase}"'))
+
+            lines.append("# HELP lql_phase_cpu_seconds_total CPU time per compiler phase.")
+            lines.append("# TYPE lql_phase_cpu_seconds_total counter")
+            for phase in self._phase_order(self.phase_cpu):
+                lines.append(f'lql_phase_cpu_seconds_total{{phase="{phase}"}} {self.phase_cpu[phase]}')
+
+            lines.append("# HELP lql_phase_peak_memory_bytes Peak allocated memory per phase (instrumented requests).")
+            lines.append("# TYPE lql_phase_peak_memory_bytes histogram")
+            for phase in self._phase_order(self.phase_memory):
+                lines.extend(self.phase_memory[phase].lines("lql_phase_peak_memory_bytes", f'phase="{phase}"'))
+
+            lines.append("# HELP lql_opcodes_executed_total TAC instructions executed per opcode.")
+            lines.append("# TYPE lql_opcodes_executed_total counter")
+            for opcode, count in sorted(self.opcodes.items()):
+                lines.append(f'lql_opcodes_executed_total{{opcode="{opcode}"}} {count}')
+
+            lines.append("# HELP lql_program_cache_hits_total Requests whose compile phases came from the program cache.")
+            lines.append("# TYPE lql_program_cache_hits_total counter")
+            lines.append(f"lql_program_cache_hits_total {self.cache_hits}")
+
+            lines.append("# HELP lql_reclaimed_values_total Values freed by the executor after their last use.")
+            lines.append("# TYPE lql_reclaimed_values_total counter")
+            lines.append(f"lql_reclaimed_values_total {self.freed_values}")
+
+            lines.append("# HELP lql_reclaimed_elements_total List elements freed by the executor after their last use.")
+            lines.append("# TYPE lql_reclaimed_elements_total counter")
+            lines.append(f"lql_reclaimed_elements_total {self.freed_elements}")
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _phase_order(per_phase):
+        return [phase for phase in PHASES if phase in per_phase]
+
+
+# Process-wide metrics served by /metrics
+metrics = Metrics()
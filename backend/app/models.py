@@ -3,9 +3,13 @@ from typing import Any, Dict, Optional
 
 class LQLRequest(BaseModel):
     code: str
+    backend: str = "list"  # execution backend: "list", "array", "vm", "vm-array" or "native"
+    instrument: bool = False  # add per-phase time/memory figures to the response
+    explain_analyze: bool = False  # add the per-instruction profile as the explain_analyze phase
 
 class LQLResponse(BaseModel):
     success: bool
     error: Optional[str]
     error_phase: Optional[str]
-    phases: Dict[str, Any]  # tokens, parser, semantic, tac, optimized_tac, execution_output
+    phases: Dict[str, Any]  # tokens, parser, semantic, tac, optimized_tac, [explain_analyze,] execution_output
+    instrumentation: Optional[Dict[str, Any]] = None  # cached, phases, total, opcodes (when requested)
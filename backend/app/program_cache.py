@@ -0,0 +1,188 @@
+import hashlib
+import os
+import sys
+import threading
+import types
+from collections import OrderedDict
+
+
+def normalize_source(code: str) -> str:
+    """
+    Normalize source text before hashing. Only line endings are unified:
+    anything else (whitespace, comments) can change token positions in the
+    cached lexer output.
+    """
+    return code.replace("\r\n", "\n")
+
+
+def source_key(code: str) -> str:
+    """Cache key of a program: SHA-256 of its normalized source"""
+    return hashlib.sha256(normalize_source(code).encode("utf-8")).hexdigest()
+
+
+def estimate_size(obj, shared=None) -> int:
+    """
+    Approximate deep size in bytes of a cached entry: containers, leaves,
+    the attributes of objects (e.g. compiled programs) and the code of
+    functions (not their module globals, which are shared). Objects also
+    reachable from shared are already counted and left out.
+    """
+    seen = set()
+    if shared is not None:
+        _deep_size(shared, seen)
+    return _deep_size(obj, seen)
+
+
+def _deep_size(obj, seen) -> int:
+    size = 0
+    stack = [obj]
+
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif isinstance(item, types.FunctionType):
+            stack.append(item.__code__)
+        elif isinstance(item, types.CodeType):
+            stack.append(item.co_code)
+            stack.append(item.co_consts)
+        elif isinstance(item, (type, types.ModuleType, types.MethodType)):
+            continue
+        elif hasattr(item, "__dict__"):
+            stack.append(vars(item))
+
+    return size
+
+
+class ProgramCache:
+    """
+    Thread-safe LRU cache of compiled programs.
+
+    Maps a source hash to the optimized TAC, the symbol table and the
+    serialized output of the compile phases, plus the bytecode / generated
+    code of each backend the program ran on (see add). Entries are evicted
+    least recently used first when either max_entries or max_bytes is
+    exceeded.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (entry, size)
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0  # entries larger than max_bytes
+
+    def get(self, key):
+        """Return the cached entry for key (or None) and count the hit/miss"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, entry):
+        """Store an entry, evicting least recently used entries as needed"""
+        size = estimate_size(entry)
+
+        with self._lock:
+            if self.max_entries <= 0 or size > self.max_bytes:
+                self.rejected += 1
+                return
+
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+
+            self._entries[key] = (entry, size)
+            self.total_bytes += size
+            self._evict()
+
+    def add(self, key, field, value):
+        """
+        Store value under field of the cached entry of key (a program
+        artifact built after the entry was cached) and count its size;
+        returns the value to use: the one already stored under field, if
+        another request added it first. If the entry is no longer cached,
+        value is only returned.
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return value
+            if field in item[0]:
+                return item[0][field]
+            counted = dict(item[0])
+
+        # Measured outside the lock; data shared with the entry (literal
+        # lists of the TAC) is already counted
+        size = estimate_size(value, shared=counted)
+
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return value
+            entry, entry_size = item
+            if field in entry:
+                return entry[field]
+
+            entry[field] = value
+            self._entries[key] = (entry, entry_size + size)
+            self.total_bytes += size
+
+            if entry_size + size > self.max_bytes:
+                # Too large with the artifact: no longer cached
+                del self._entries[key]
+                self.total_bytes -= entry_size + size
+                self.rejected += 1
+            self._evict()
+            return value
+
+    def _evict(self):
+        """Drop least recently used entries until both limits hold (lock held)"""
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> dict:
+        """Counters used to size the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "rejected": self.rejected,
+            }
+
+
+# Process-wide cache used by run_lql (size configurable through the environment)
+program_cache = ProgramCache(
+    max_entries=int(os.environ.get("LQL_CACHE_MAX_ENTRIES", 256)),
+    max_bytes=int(os.environ.get("LQL_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+)
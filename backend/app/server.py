@@ -1,9 +1,29 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.models import LQLRequest, LQLResponse
 from app.lql_engine import run_lql
+from app.program_cache import program_cache
+from app.metrics import metrics
+from app.worker_pool import PoolSaturated, pool_from_env
+from map_expressions import map_expr_cache_info
+
+# ===========================
+# Worker pool for run_lql
+# ===========================
+worker_pool = pool_from_env()
 
-app = FastAPI(title="LQL Backend", version="1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    worker_pool.shutdown()
+
+
+app = FastAPI(title="LQL Backend", version="1.0", lifespan=lifespan)
 
 # ===========================
 # CORS for React.js frontend
@@ -21,16 +41,55 @@ app.add_middleware(
 # ===========================
 @app.post("/run", response_model=LQLResponse)
 async def run_code(request: LQLRequest):
-    result = run_lql(request.code)
+    # run_lql is CPU-bound: run it on the pool so the event loop stays free
+    try:
+        result = await worker_pool.submit(
+            run_lql, request.code, request.backend, request.instrument, request.explain_analyze
+        )
+    except PoolSaturated as e:
+        metrics.record_rejected("busy")
+        raise HTTPException(status_code=503, detail=f"Server busy: {e}", headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        metrics.record_rejected("timeout")
+        raise HTTPException(status_code=504, detail=f"Execution timed out after {worker_pool.timeout}s")
+
+    metrics.record(result)
 
     return LQLResponse(
         success=result["success"],
         error=result["error"],
         error_phase=result["error_phase"],
-        phases=result["phases"]
+        phases=result["phases"],
+        instrumentation=result["instrumentation"] if request.instrument else None
     )
 
 
+# ===========================
+# Cache statistics
+# ===========================
+@app.get("/cache")
+async def cache_stats():
+    map_info = map_expr_cache_info()
+    return {
+        "programs": program_cache.stats(),
+        "worker_pool": worker_pool.stats(),
+        "map_expressions": {
+            "entries": map_info.currsize,
+            "max_entries": map_info.maxsize,
+            "hits": map_info.hits,
+            "misses": map_info.misses,
+        },
+    }
+
+
+# ===========================
+# Prometheus metrics
+# ===========================
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 # ===========================
 # Health check
 # ===========================
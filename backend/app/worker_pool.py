@@ -0,0 +1,85 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class PoolSaturated(Exception):
+    """Raised when every worker is busy and the queue is full"""
+
+
+class WorkerPool:
+    """
+    Runs blocking, CPU-bound jobs (run_lql) off the asyncio event loop.
+
+    kind:       "thread" or "process"
+    workers:    number of worker threads/processes
+    queue_size: jobs allowed to wait for a free worker; beyond
+                workers + queue_size, submit() raises PoolSaturated
+    timeout:    seconds a request waits for its job (None = no limit)
+
+    A job that times out keeps its slot until it really finishes, so a
+    pool full of runaway programs reports itself as saturated.
+    """
+
+    def __init__(self, kind="thread", workers=4, queue_size=16, timeout=10.0):
+        if kind == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lql")
+        elif kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            raise ValueError(f"Unknown worker pool kind: {kind}")
+
+        self.kind = kind
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._capacity = workers + queue_size
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    async def submit(self, fn, *args):
+        """Run fn(*args) on the pool and await its result"""
+        with self._lock:
+            if self._pending >= self._capacity:
+                raise PoolSaturated(f"All {self.workers} workers busy and {self.queue_size} jobs queued")
+            self._pending += 1
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        # On timeout wait_for cancels the job if it has not started yet
+        return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = self._pending
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "pending": pending,
+            "timeout": self.timeout,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def pool_from_env() -> WorkerPool:
+    """Build the server's worker pool from LQL_POOL_* environment variables"""
+    timeout = float(os.environ.get("LQL_POOL_TIMEOUT", 10))
+    return WorkerPool(
+        kind=os.environ.get("LQL_POOL_KIND", "thread"),
+        workers=int(os.environ.get("LQL_POOL_WORKERS", os.cpu_count() or 4)),
+        queue_size=int(os.environ.get("LQL_POOL_QUEUE_SIZE", 32)),
+        timeout=timeout if timeout > 0 else None,
+    )
@@ -0,0 +1,364 @@
+from code_executer import EXECUTOR_BACKENDS, Executor, ArrayExecutor, common_dtype
+from liveness import analyze_liveness
+from map_expressions import map_order, sorted_order
+
+# ==========================================================
+# BYTECODE
+# ==========================================================
+#
+# Every instruction is (opcode, args, release): opcode is an int indexing
+# the VM handler table, args a tuple of ints, release None or the slots to
+# clear afterwards (see Liveness.release) as (slots, owner slots). Names are resolved to slot indexes
+# once, at lowering time; literals (lists, operators, expressions...) live
+# in the constant pool. An operand that can be either a name or a literal
+# (SETOP / LISTOP / LIST sources) is a slot index when >= 0 and ~k for
+# constant k when negative.
+
+(
+    OP_LIST,    # dest, k_values, k_order      list literal (scalars become [v])
+    OP_ALIAS,   # dest, src                    list x = y / COPY
+    OP_FILTER,  # dest, src, k_op, k_value
+    OP_SORT,    # slot, k_order, k_in_place     (Liveness.in_place mode)
+    OP_MAP,     # dest, src, k_expr, k_dtype   (Optimizer.types dtype)
+    OP_STAT,    # dest, k_func, src, k_arg
+    OP_STATS,   # k_dests, k_funcs, src
+    OP_SETOP,   # dest, k_op, left, right
+    OP_LISTOP,  # dest, k_op, left, right, k_dtype
+    OP_FUSED,   # dest, src, k_stages, k_func
+    OP_PRINT,   # slot
+    OP_CONST,   # dest, k_value                scalar computed at compile time
+) = range(12)
+
+OPCODE_NAMES = ("LIST", "ALIAS", "FILTER", "SORT", "MAP", "STAT", "STATS",
+                "SETOP", "LISTOP", "FUSED", "PRINT", "CONST")
+
+
+class Program:
+    """Bytecode of one TAC program: code, constant pool and slot names"""
+
+    def __init__(self):
+        self.code = []    # (opcode, args, release) triples
+        self.consts = []  # constant pool
+        self.names = []   # slot index -> variable / temp name
+        self._slots = {}  # name -> slot index
+        self._const_index = {}
+
+    def slot(self, name):
+        """Slot index of a name (allocated on first use)"""
+        index = self._slots.get(name)
+        if index is None:
+            index = self._slots[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def const(self, value):
+        """Constant pool index of value (hashable values are shared)"""
+        try:
+            hash(value)
+        except TypeError:  # lists
+            key = index = None
+        else:
+            # Keyed on repr: -0.0 == 0.0 (with the same hash), but they print
+            # differently
+            key = (type(value), repr(value))
+            index = self._const_index.get(key)
+        if index is None:
+            index = len(self.consts)
+            self.consts.append(value)
+            if key is not None:
+                self._const_index[key] = index
+        return index
+
+    def operand(self, value):
+        """Encode a name (slot) or literal (~constant) operand"""
+        if isinstance(value, str):
+            return self.slot(value)
+        return ~self.const(value)
+
+    def emit(self, opcode, *args):
+        self.code.append((opcode, args, None))
+
+    def emit_release(self, dead):
+        """Attach the (name, owner) pairs to drop to the last instruction"""
+        slots = tuple(self.slot(name) for name, _ in dead)
+        owners = tuple(self.slot(name) for name, owner in dead if owner)
+        opcode, args, _ = self.code[-1]
+        self.code[-1] = (opcode, args, (slots, owners))
+
+    def disassemble(self):
+        """Readable listing of the bytecode (for debugging)"""
+        return [
+            f"{i:04} {OPCODE_NAMES[op]:<7} {args}" + (f" free {release[0]}" if release else "")
+            for i, (op, args, release) in enumerate(self.code)
+        ]
+
+
+def lower_tac(tac, liveness=None, types=None):
+    """Lower optimized TAC into a bytecode Program (types: Optimizer.types)"""
+    program = Program()
+    if liveness is None:
+        liveness = analyze_liveness(tac)
+    types = types or {}
+
+    for index, (instr, dead) in enumerate(zip(tac, liveness.release)):
+        opcode = instr[0]
+
+        if opcode in ("LIST", "COPY"):
+            # ('LIST', name, source) / ('COPY', dest, src)
+            _, dest, source = instr
+            if isinstance(source, str):
+                program.emit(OP_ALIAS, program.slot(dest), program.slot(source))
+            elif isinstance(source, list):
+                program.emit(OP_LIST, program.slot(dest), program.const(source),
+                             program.const(sorted_order(source)))
+            elif isinstance(source, (int, float)):
+                program.emit(OP_LIST, program.slot(dest), program.const([source]), program.const("asc"))
+            else:
+                raise Exception(f"Invalid {opcode} source: {source}")
+
+        elif opcode == "CONST":
+            _, dest, value = instr
+            program.emit(OP_CONST, program.slot(dest), program.const(value))
+
+        elif opcode == "FILTER":
+            _, dest, src, op, value = instr
+            program.emit(OP_FILTER, program.slot(dest), program.slot(src), program.const(op), program.const(value))
+
+        elif opcode == "SORT":
+            _, name, order = instr
+            program.emit(OP_SORT, program.slot(name), program.const(order),
+                         program.const(liveness.in_place.get(index)))
+
+        elif opcode == "MAP":
+            _, dest, src, expr_code = instr
+            program.emit(OP_MAP, program.slot(dest), program.slot(src), program.const(expr_code),
+                         program.const(common_dtype(types, src)))
+
+        elif opcode == "STAT":
+            _, dest, func, src, *args = instr
+            program.emit(OP_STAT, program.slot(dest), program.const(func), program.slot(src),
+                         program.const(args[0] if args else None))
+
+        elif opcode == "STATS":
+            _, dests, funcs, src = instr
+            slots = tuple(program.slot(dest) for dest in dests)
+            program.emit(OP_STATS, program.const(slots), program.const(funcs), program.slot(src))
+
+        elif opcode == "SETOP":
+            _, dest, op, left, right = instr
+            program.emit(OP_SETOP, program.slot(dest), program.const(op),
+                         program.operand(left), program.operand(right))
+
+        elif opcode == "LISTOP":
+            _, dest, op, left, right = instr
+            program.emit(OP_LISTOP, program.slot(dest), program.const(op), program.operand(left),
+                         program.operand(right), program.const(common_dtype(types, left, right)))
+
+        elif opcode == "FUSED":
+            _, dest, src, stages, func = instr
+            program.emit(OP_FUSED, program.slot(dest), program.slot(src), program.const(stages), program.const(func))
+
+        elif opcode == "PRINT":
+            program.emit(OP_PRINT, program.slot(instr[1]))
+
+        else:
+            raise Exception(f"Unknown opcode: {opcode}")
+
+        if dead:
+            program.emit_release(dead)
+
+    return program
+
+
+# ==========================================================
+# VIRTUAL MACHINE
+# ==========================================================
+
+class VMExecutor(Executor):
+    """
+    Executes TAC as bytecode: a table-driven loop over (opcode, args)
+    pairs, with values in a slot list instead of the name -> value dict.
+
+    Values are computed by the same hooks as Executor (filter_values,
+    compute_stat, ...), so results and error messages are identical and
+    storage backends combine with it (see ArrayVMExecutor). self.program
+    can be set to an already lowered Program (run_lql keeps it with the
+    cached program under program_key); otherwise run() lowers self.tac.
+    self.memory is filled from the slots when run() ends.
+    """
+
+    program_key = "bytecode"
+
+    def __init__(self, tac, symbol_table=None, output=None):
+        super().__init__(tac, symbol_table, output)
+        self.program = None
+        self.handlers = (
+            self.op_list, self.op_alias, self.op_filter, self.op_sort, self.op_map, self.op_stat,
+            self.op_stats, self.op_setop, self.op_listop, self.op_fused, self.op_print,
+            self.op_const,
+        )
+
+    def build_program(self):
+        return lower_tac(self.tac, self.get_liveness(), self.types)
+
+    def run(self):
+        """Execute the bytecode of all TAC instructions"""
+        if self.profiler is not None:
+            # EXPLAIN ANALYZE profiles TAC instructions
+            return super().run()
+
+        if self.program is None:
+            self.program = self.build_program()
+        program = self.program
+
+        self.consts = program.consts
+        self.names = program.names
+        self.slots = list(map(self.memory.get, program.names))
+        self.slot_order = [None] * len(program.names)  # 'asc' / 'desc' / None per slot
+        handlers = self.handlers
+        executed = 0
+
+        try:
+            for opcode, args, release in program.code:
+                handlers[opcode](*args)
+                executed += 1
+                if release:
+                    self.release_slots(*release)
+        finally:
+            self.executed = executed
+            self.sync_memory()
+
+        return self.memory
+
+    def sync_memory(self):
+        """Copy the slots back into self.memory (cleared slots are removed)"""
+        memory = self.memory
+        for name, value in zip(self.names, self.slots):
+            if value is None:
+                memory.pop(name, None)
+            else:
+                memory[name] = value
+
+    # ---------- Operand access ----------
+
+    def slot_list(self, slot):
+        """get_list for a slot"""
+        value = self.slots[slot]
+        if value is None:
+            raise Exception(f"Variable '{self.names[slot]}' not found")
+        if self.is_list(value):
+            return value
+        return [value]
+
+    def slot_operand(self, operand):
+        """get_operand for an encoded operand (slot or ~constant)"""
+        if operand < 0:
+            return self.consts[~operand]
+        value = self.slots[operand]
+        if value is None:
+            raise Exception(f"Variable '{self.names[operand]}' not found")
+        return value
+
+    def release_slots(self, slots, owners):
+        """Clear slots whose values are never read again"""
+        values = self.slots
+        for slot in owners:
+            value = values[slot]
+            if value is not None:
+                self.freed_values += 1
+                if self.is_list(value):
+                    self.freed_elements += len(value)
+        for slot in slots:
+            values[slot] = None
+            self.slot_order[slot] = None
+
+    # ---------- Handlers ----------
+
+    def op_list(self, dest, k_values, k_order):
+        self.slots[dest] = self.make_list(self.consts[k_values])
+        self.slot_order[dest] = self.consts[k_order]
+
+    def op_alias(self, dest, src):
+        self.slots[dest] = self.slots[src]
+        self.slot_order[dest] = self.slot_order[src]
+
+    def op_const(self, dest, k_value):
+        self.slots[dest] = self.consts[k_value]
+        self.slot_order[dest] = None
+
+    def op_filter(self, dest, src, k_op, k_value):
+        lst = self.slot_list(src)
+        order = self.slot_order[src]
+        if order:
+            self.slots[dest] = self.filter_sorted(lst, self.consts[k_op], self.consts[k_value], order)
+        else:
+            self.slots[dest] = self.filter_values(lst, self.consts[k_op], self.consts[k_value])
+        self.slot_order[dest] = order
+
+    def op_sort(self, slot, k_order, k_in_place):
+        order = self.consts[k_order]
+        if self.slot_order[slot] == order:
+            return  # already sorted
+        if self.may_sort_in_place(self.consts[k_in_place]):
+            self.slots[slot] = self.sort_in_place(self.slot_list(slot), order)
+        else:
+            self.slots[slot] = self.sort_values(self.slot_list(slot), order)
+        self.slot_order[slot] = order
+
+    def op_map(self, dest, src, k_expr, k_dtype):
+        expr_code = self.consts[k_expr]
+        self.slots[dest] = self.map_values(self.slot_list(src), expr_code, self.consts[k_dtype])
+        self.slot_order[dest] = map_order(expr_code, self.slot_order[src])
+
+    def op_stat(self, dest, k_func, src, k_arg):
+        self.slots[dest] = self.compute_stat(
+            self.consts[k_func], self.slot_list(src), self.consts[k_arg], self.slot_order[src]
+        )
+        self.slot_order[dest] = None
+
+    def op_stats(self, k_dests, k_funcs, src):
+        values = self.compute_stats(self.consts[k_funcs], self.slot_list(src), self.slot_order[src])
+        for dest, value in zip(self.consts[k_dests], values):
+            self.slots[dest] = value
+            self.slot_order[dest] = None
+
+    def op_setop(self, dest, k_op, left, right):
+        a = self.slot_list(left) if left >= 0 else self.consts[~left]
+        if not isinstance(a, list) and not self.is_list(a):
+            raise Exception(f"Invalid SETOP left operand: {a}")
+        b = self.slot_list(right) if right >= 0 else self.consts[~right]
+        if not isinstance(b, list) and not self.is_list(b):
+            raise Exception(f"Invalid SETOP right operand: {b}")
+        self.slots[dest] = self.set_operation(self.consts[k_op], a, b)
+        self.slot_order[dest] = None
+
+    def op_listop(self, dest, k_op, left, right, k_dtype):
+        self.slots[dest] = self.element_wise_op(
+            self.consts[k_op], self.slot_operand(left), self.slot_operand(right), self.consts[k_dtype]
+        )
+        self.slot_order[dest] = None
+
+    def op_fused(self, dest, src, k_stages, k_func):
+        stages, func = self.consts[k_stages], self.consts[k_func]
+        self.slots[dest] = self.run_pipeline(self.slot_list(src), stages, func)
+
+        order = self.slot_order[src] if func is None else None
+        for stage in stages:
+            if stage[0] == "MAP":
+                order = map_order(stage[1], order)
+        self.slot_order[dest] = order
+
+    def op_print(self, slot):
+        value = self.slots[slot]
+        if value is None:
+            raise Exception(f"Variable '{self.names[slot]}' not found in memory")
+        self.emit(self.to_output(value))
+
+
+class ArrayVMExecutor(VMExecutor, ArrayExecutor):
+    """Bytecode VM over the NumPy storage and kernels of ArrayExecutor"""
+
+
+# Selectable through create_executor(..., backend="vm" / "vm-array")
+EXECUTOR_BACKENDS["vm"] = VMExecutor
+EXECUTOR_BACKENDS["vm-array"] = ArrayVMExecutor
@@ -1,9 +1,182 @@
+import bisect
 import math
+import operator
+import random
+
+from liveness import analyze_liveness
+from map_expressions import compile_map_expr, map_order, sorted_order
+from predicates import compile_predicate, predicate_bounds
+
+try:
+    import numpy as np
+except ImportError:  # the array backend is optional
+    np = None
+
+
+# Element-wise list operators (resolved once per LISTOP, not per element)
+LIST_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '%': operator.mod,
+    'and': lambda a, b: int(a) & int(b),
+    'or': lambda a, b: int(a) | int(b),
+    'xor': lambda a, b: int(a) ^ int(b),
+}
+
+# Bitwise operators for elements statically known to be ints (no int())
+INT_OPERATORS = dict(LIST_OPERATORS, **{
+    'and': operator.and_,
+    'or': operator.or_,
+    'xor': operator.xor,
+})
+
+COMPARISON_OPERATORS = {
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+
+# Comparison with the operands swapped (x > v  <=>  -x < -v)
+FLIPPED_COMPARISONS = {'>': '<', '>=': '<=', '<': '>', '<=': '>='}
+
+# STAT functions computed from order statistics rather than a running summary
+ORDER_STATS = ('median', 'percentile', 'quantile')
+
+
+def stat_func(spec):
+    """Function name of a STATS entry ('mean' or ('percentile', 90.0))"""
+    return spec[0] if isinstance(spec, tuple) else spec
+
+
+def _filter_stage(values, compare, val):
+    """Pipeline stage: keep values where compare(x, val) holds"""
+    for x in values:
+        if compare(x, val):
+            yield x
+
+
+def _map_stage(values, map_func, expr_code):
+    """Pipeline stage: apply a compiled MAP expression (int(x) semantics)"""
+    for x in values:
+        try:
+            yield map_func(int(x))
+        except Exception as e:
+            raise Exception(f"Error evaluating map expression '{expr_code}' with x={x}: {e}")
+
+
+def summarize(values):
+    """
+    One streaming pass over values: returns (count, sum, min, max, m2) where
+    m2 is the sum of squared deviations from the mean, accumulated with
+    Welford's numerically stable update (variance = m2 / count).
+    """
+    n = 0
+    total = 0
+    low = high = None
+    mean = 0.0
+    m2 = 0.0
+    
+    for x in values:
+        n += 1
+        total += x
+        if low is None or x < low:
+            low = x
+        if high is None or x > high:
+            high = x
+        delta = x - mean
+        mean += delta / n
+        m2 += delta * (x - mean)
+    
+    return n, total, low, high, m2
+
+
+# Pivot source for select_kth (private, so callers' random state is untouched)
+_pivot_random = random.Random()
+
+
+def select_kth(values, k, pair=False):
+    """
+    Return the k-th smallest element (0-based) of values in average linear
+    time (quickselect with a random pivot and three-way partition), without
+    sorting a copy of the list. With pair=True return the k-th and
+    (k+1)-th smallest elements, as needed by medians and quantiles.
+    """
+    upper = None  # smallest element above the current sublist
+    
+    while True:
+        pivot = values[_pivot_random.randrange(len(values))]
+        lows = [x for x in values if x < pivot]
+        if k < len(lows):
+            values = lows
+            upper = pivot
+            continue
+        
+        highs = [x for x in values if x > pivot]
+        n_low_eq = len(values) - len(highs)
+        if k < n_low_eq:
+            if not pair:
+                return pivot
+            if k + 1 < n_low_eq:
+                return pivot, pivot
+            return pivot, (min(highs) if highs else upper)
+        
+        k -= n_low_eq
+        values = highs
+
+
+def common_dtype(types, *operands):
+    """
+    Element type shared by all operands according to the static shapes
+    of Optimizer.types ("int" / "float"), or None when unknown.
+    """
+    dtypes = set()
+    for operand in operands:
+        shape = types.get(operand) if isinstance(operand, str) else None
+        dtypes.add(shape["dtype"] if shape else None)
+    return dtypes.pop() if len(dtypes) == 1 else None
+
+
+def make_output_sink(output):
+    """
+    Turn an output target into a function that receives each printed value.
+
+    None     -> print() to sys.stdout (looked up at print time)
+    list     -> values are appended as plain Python values
+    writer   -> any object with write(); gets str(value) + newline
+    callable -> called with the plain Python value
+    """
+    if output is None:
+        return print
+    if isinstance(output, list):
+        return output.append
+    if hasattr(output, "write"):
+        return lambda value: output.write(f"{value}\n")
+    if callable(output):
+        return output
+    raise Exception(f"Invalid output sink: {output!r}")
+
 
 class Executor:
-    def __init__(self, tac, symbol_table=None):
+    # make_list keeps TAC literals by reference, so they are never mutated
+    copies_literals = False
+
+    def __init__(self, tac, symbol_table=None, output=None):
         self.tac = tac
         self.memory = {}  # stores lists, temps, and scalars
+        self.emit = make_output_sink(output)  # receives every PRINT value
+        self.order = {}  # list name -> 'asc' / 'desc' when known to be sorted
+        self.executed = 0  # instructions completed by run()
+        self.profiler = None  # optional hook wrapping every instruction (EXPLAIN ANALYZE)
+        self.liveness = None  # Liveness of tac (computed by run() if not set)
+        self.types = {}  # name -> static shape (Optimizer.types), selects typed kernels
+        self.freed_values = 0    # values dropped after their last use
+        self.freed_elements = 0  # elements of the lists among them
         
         # Initialize with symbol table if provided
         if symbol_table:
@@ -14,38 +187,79 @@ class Executor:
     # ------------------------------------------------------
     def run(self):
         """Execute all TAC instructions"""
-        for instr in self.tac:
-            opcode = instr[0]
+        release = self.get_liveness().release
 
-            if opcode == "LIST":
-                self.exec_list(instr)
-            
-            elif opcode == "FILTER":
-                self.exec_filter(instr)
-            
-            elif opcode == "SORT":
-                self.exec_sort(instr)
-            
-            elif opcode == "MAP":
-                self.exec_map(instr)
-            
-            elif opcode == "STAT":
-                self.exec_stat(instr)
-            
-            elif opcode == "SETOP":
-                self.exec_setop(instr)
-            
-            elif opcode == "LISTOP":
-                self.exec_listop(instr)
-            
-            elif opcode == "COPY":
-                self.exec_copy(instr)
-            
-            elif opcode == "PRINT":
-                self.exec_print(instr)
-            
+        for instr, dead in zip(self.tac, release):
+            if self.profiler is None:
+                self.execute(instr)
             else:
-                raise Exception(f"Unknown opcode: {opcode}")
+                self.profiler.profile(self, instr)
+            
+            self.executed += 1
+
+            # Drop values that are never read again
+            if dead:
+                self.release_values(dead)
+
+        return self.memory
+
+    def get_liveness(self):
+        if self.liveness is None:
+            self.liveness = analyze_liveness(self.tac)
+        return self.liveness
+
+    def release_values(self, dead):
+        """Remove (name, owner) pairs from memory (see Liveness.release)"""
+        for name, owner in dead:
+            value = self.memory.pop(name, None)
+            self.order.pop(name, None)
+            if owner and value is not None:
+                self.freed_values += 1
+                if self.is_list(value):
+                    self.freed_elements += len(value)
+
+    def execute(self, instr):
+        """Execute one TAC instruction"""
+        opcode = instr[0]
+
+        if opcode == "LIST":
+            self.exec_list(instr)
+        
+        elif opcode == "FILTER":
+            self.exec_filter(instr)
+        
+        elif opcode == "SORT":
+            self.exec_sort(instr)
+        
+        elif opcode == "MAP":
+            self.exec_map(instr)
+        
+        elif opcode == "STAT":
+            self.exec_stat(instr)
+        
+        elif opcode == "SETOP":
+            self.exec_setop(instr)
+        
+        elif opcode == "LISTOP":
+            self.exec_listop(instr)
+        
+        elif opcode == "COPY":
+            self.exec_copy(instr)
+        
+        elif opcode == "CONST":
+            self.exec_const(instr)
+        
+        elif opcode == "FUSED":
+            self.exec_fused(instr)
+        
+        elif opcode == "STATS":
+            self.exec_stats(instr)
+        
+        elif opcode == "PRINT":
+            self.exec_print(instr)
+        
+        else:
+            raise Exception(f"Unknown opcode: {opcode}")
 
         return self.memory
 
@@ -59,11 +273,14 @@ class Executor:
         
         # Source can be: literal list, identifier, or scalar
         if isinstance(source, list):
-            self.memory[name] = source
+            self.memory[name] = self.make_list(source)
+            self.set_order(name, sorted_order(source))
         elif isinstance(source, str):
             self.memory[name] = self.memory[source]
+            self.set_order(name, self.order.get(source))
         elif isinstance(source, (int, float)):
-            self.memory[name] = [source]
+            self.memory[name] = self.make_list([source])
+            self.set_order(name, "asc")
         else:
             raise Exception(f"Invalid LIST source: {source}")
 
@@ -71,43 +288,49 @@ class Executor:
         """Execute: ('FILTER', dest, src, op, value)"""
         _, dest, src, op, val = instr
         lst = self.get_list(src)
-        self.memory[dest] = [x for x in lst if self.eval_condition(x, op, val)]
+        order = self.order.get(src)
+        
+        # A sorted list is filtered with a binary search; the result stays sorted
+        if order:
+            self.memory[dest] = self.filter_sorted(lst, op, val, order)
+        else:
+            self.memory[dest] = self.filter_values(lst, op, val)
+        self.set_order(dest, order)
 
     def exec_sort(self, instr):
-        """Execute: ('SORT', name, order) - modifies in place"""
+        """Execute: ('SORT', name, order) - in place unless the list is shared"""
         _, name, order = instr
+        if self.order.get(name) == order:
+            return  # already sorted
         lst = self.get_list(name)
-        self.memory[name] = sorted(lst, reverse=(order == "desc"))
+        # self.executed is the index of the running instruction
+        if self.may_sort_in_place(self.get_liveness().in_place.get(self.executed)):
+            self.memory[name] = self.sort_in_place(lst, order)
+        else:
+            self.memory[name] = self.sort_values(lst, order)
+        self.order[name] = order
 
     def exec_map(self, instr):
         """Execute: ('MAP', dest, src, expr_code)"""
         _, dest, src, expr_code = instr
         lst = self.get_list(src)
-        
-        # Expression uses 'x' as the variable name
-        # Create a safe evaluation function
-        def map_func(x):
-            try:
-                # Provide safe math functions
-                safe_globals = {
-                    '__builtins__': {},
-                    'abs': abs,
-                    'min': min,
-                    'max': max,
-                    'int': int,
-                    'float': float
-                }
-                return eval(expr_code, safe_globals, {'x': int(x)})
-            except Exception as e:
-                raise Exception(f"Error evaluating map expression '{expr_code}' with x={x}: {e}")
-        
-        self.memory[dest] = [map_func(x) for x in lst]
+        self.memory[dest] = self.map_values(lst, expr_code, common_dtype(self.types, src))
+        self.set_order(dest, map_order(expr_code, self.order.get(src)))
 
     def exec_stat(self, instr):
         """Execute: ('STAT', dest, func, list_name)"""
-        _, dest, func, src = instr
+        _, dest, func, src, *args = instr  # percentile / quantile take an arg
         lst = self.get_list(src)
-        self.memory[dest] = self.compute_stat(func, lst)
+        self.memory[dest] = self.compute_stat(func, lst, *args, order=self.order.get(src))
+        self.set_order(dest, None)
+
+    def exec_stats(self, instr):
+        """Execute: ('STATS', dests, funcs, list_name) - several stats, one pass"""
+        _, dests, funcs, src = instr
+        lst = self.get_list(src)
+        for dest, value in zip(dests, self.compute_stats(funcs, lst, self.order.get(src))):
+            self.memory[dest] = value
+            self.set_order(dest, None)
 
     def exec_setop(self, instr):
         """Execute: ('SETOP', dest, op, left, right)"""
@@ -130,6 +353,7 @@ class Executor:
             raise Exception(f"Invalid SETOP right operand: {right}")
         
         self.memory[dest] = self.set_operation(op, a, b)
+        self.set_order(dest, None)
 
     def exec_listop(self, instr):
         """Execute: ('LISTOP', dest, op, left, right) - element-wise operations"""
@@ -142,7 +366,10 @@ class Executor:
         right_val = self.get_operand(right)
         
         # Perform element-wise operation
-        self.memory[dest] = self.element_wise_op(op, left_val, right_val)
+        self.memory[dest] = self.element_wise_op(
+            op, left_val, right_val, common_dtype(self.types, left, right)
+        )
+        self.set_order(dest, None)
 
     def exec_copy(self, instr):
         """Execute: ('COPY', dest, src)"""
@@ -150,28 +377,42 @@ class Executor:
         
         if isinstance(src, str):
             self.memory[dest] = self.memory[src]
+            self.set_order(dest, self.order.get(src))
         elif isinstance(src, list):
-            self.memory[dest] = src
+            self.memory[dest] = self.make_list(src)
+            self.set_order(dest, sorted_order(src))
         elif isinstance(src, (int, float)):
-            self.memory[dest] = [src]
+            self.memory[dest] = self.make_list([src])
+            self.set_order(dest, "asc")
         else:
             raise Exception(f"Invalid COPY source: {src}")
 
+    def exec_const(self, instr):
+        """Execute: ('CONST', dest, value) - a scalar computed at compile time"""
+        _, dest, value = instr
+        self.memory[dest] = value
+        self.set_order(dest, None)
+
+    def exec_fused(self, instr):
+        """Execute: ('FUSED', dest, src, stages, func) - fused FILTER/MAP chain"""
+        _, dest, src, stages, func = instr
+        lst = self.get_list(src)
+        self.memory[dest] = self.run_pipeline(lst, stages, func)
+        
+        # A list result keeps the source order through filters and monotonic maps
+        order = self.order.get(src) if func is None else None
+        for stage in stages:
+            if stage[0] == "MAP":
+                order = map_order(stage[1], order)
+        self.set_order(dest, order)
+
     def exec_print(self, instr):
         """Execute: ('PRINT', target)"""
         _, target = instr
         
         if target in self.memory:
-            value = self.memory[target]
-            
-            # Pretty print lists
-            if isinstance(value, list):
-                print(value)
-            # Print scalar values (from STAT operations)
-            elif isinstance(value, (int, float)):
-                print(value)
-            else:
-                print(value)
+            # Lists and scalar values (from STAT operations) go to the sink
+            self.emit(self.to_output(self.memory[target]))
         else:
             raise Exception(f"Variable '{target}' not found in memory")
 
@@ -179,20 +420,27 @@ class Executor:
     # HELPER FUNCTIONS
     # ------------------------------------------------------
     
+    def set_order(self, name, order):
+        """Record the sort order of name's list (None: unknown / unsorted)"""
+        if order:
+            self.order[name] = order
+        else:
+            self.order.pop(name, None)
+
     def get_list(self, src):
         """Get a list from memory or convert scalar to list"""
         if isinstance(src, str):
             val = self.memory.get(src)
             if val is None:
                 raise Exception(f"Variable '{src}' not found")
-            if isinstance(val, list):
+            if self.is_list(val):
                 return val
             # Convert scalar to single-element list
             return [val]
         elif isinstance(src, list):
-            return src
+            return self.make_list(src)
         elif isinstance(src, (int, float)):
-            return [src]
+            return self.make_list([src])
         else:
             raise Exception(f"Invalid list source: {src}")
 
@@ -210,8 +458,11 @@ class Executor:
         else:
             raise Exception(f"Invalid operand: {operand}")
 
-    def element_wise_op(self, op, left, right):
-        """Perform element-wise operation on lists/scalars"""
+    def element_wise_op(self, op, left, right, dtype=None):
+        """Perform element-wise operation on lists/scalars (dtype: their static element type)"""
+        func = (INT_OPERATORS if dtype == "int" else LIST_OPERATORS).get(op)
+        if func is None:
+            raise Exception(f"Unknown list operator: {op}")
         
         # Convert scalars to lists for uniform handling
         left_list = left if isinstance(left, list) else [left]
@@ -227,95 +478,135 @@ class Executor:
         elif len(left_list) != len(right_list):
             raise Exception(f"List length mismatch: {len(left_list)} vs {len(right_list)}")
         
-        # Perform element-wise operation
-        result = []
-        for a, b in zip(left_list, right_list):
-            if op == '+':
-                result.append(a + b)
-            elif op == '-':
-                result.append(a - b)
-            elif op == '*':
-                result.append(a * b)
-            elif op == '/':
-                if b == 0:
-                    raise Exception("Division by zero")
-                result.append(a / b)
-            elif op == '%':
-                if b == 0:
-                    raise Exception("Modulo by zero")
-                result.append(a % b)
-            elif op == 'and':
-                # Bitwise AND (convert to int for bitwise ops)
-                result.append(int(a) & int(b))
-            elif op == 'or':
-                # Bitwise OR
-                result.append(int(a) | int(b))
-            elif op == 'xor':
-                # Bitwise XOR
-                result.append(int(a) ^ int(b))
-            else:
-                raise Exception(f"Unknown list operator: {op}")
+        # Zero divisors are rejected up front instead of per element
+        if op == '/' and 0 in right_list:
+            raise Exception("Division by zero")
+        if op == '%' and 0 in right_list:
+            raise Exception("Modulo by zero")
         
-        return result
+        return [func(a, b) for a, b in zip(left_list, right_list)]
 
-    def eval_condition(self, x, op, val):
-        """Evaluate comparison condition"""
-        if op == ">":
-            return x > val
-        elif op == "<":
-            return x < val
-        elif op == ">=":
-            return x >= val
-        elif op == "<=":
-            return x <= val
-        elif op == "==":
-            return x == val
-        elif op == "!=":
-            return x != val
-        else:
-            raise Exception(f"Invalid comparison operator: {op}")
+    def filter_values(self, lst, op, val):
+        """Keep the elements of lst that satisfy 'x op val' (or predicate (op, val))"""
+        compare = COMPARISON_OPERATORS.get(op)
+        if compare is None:
+            # and / or of comparisons (predicates.py); raises for unknown ops
+            test = compile_predicate(op, val)
+            return [x for x in lst if test(x)]
+        return [x for x in lst if compare(x, val)]
 
-    # def compute_stat(self, func, lst):
-    #     """Compute statistical function on list"""
-    #     if not lst:
-    #         raise Exception(f"Cannot compute {func} on empty list")
-        
-    #     if func == "sum":
-    #         return sum(lst)
+    def filter_sorted(self, lst, op, val, order):
+        """filter_values for a list sorted in order: binary search and slice"""
+        if op not in COMPARISON_OPERATORS:
+            # A range is one slice per bound; other predicates scan the
+            # list, which keeps it sorted
+            bounds = predicate_bounds(op, val)
+            if bounds is None:
+                return self.filter_values(lst, op, val)
+            for op, val in bounds:
+                lst = self.filter_sorted(lst, op, val, order)
+            return lst
+        
+        # Search a descending list through negated keys: x op v <=> -x op' -v
+        key = None
+        if order == "desc":
+            op, val, key = FLIPPED_COMPARISONS.get(op, op), -val, operator.neg
+        
+        left = bisect.bisect_left(lst, val, key=key)
+        right = bisect.bisect_right(lst, val, key=key)
         
-    #     elif func == "mean":
-    #         return sum(lst) / len(lst)
-        
-    #     elif func == "min":
-    #         return min(lst)
-        
-    #     elif func == "max":
-    #         return max(lst)
-        
-    #     elif func == "count":
-    #         return len(lst)
+        if op == ">":
+            return lst[right:]
+        if op == ">=":
+            return lst[left:]
+        if op == "<":
+            return lst[:left]
+        if op == "<=":
+            return lst[:right]
+        if op == "==":
+            return lst[left:right]
+        return lst[:left] + lst[right:]  # !=
+
+    def sort_values(self, lst, order):
+        """Return lst sorted in asc/desc order"""
+        return sorted(lst, reverse=(order == "desc"))
+
+    def may_sort_in_place(self, mode):
+        """Whether a SORT with Liveness.in_place mode may reuse the list"""
+        return mode == "owned" or (mode == "literal" and self.copies_literals)
+
+    def sort_in_place(self, lst, order):
+        """sort_values for a list no other name holds: sorts lst itself"""
+        lst.sort(reverse=(order == "desc"))
+        return lst
+
+    def map_values(self, lst, expr_code, dtype=None):
+        """Apply a MAP expression (which uses 'x' as the variable) to every element"""
+        map_func = compile_map_expr(expr_code)
+        try:
+            if dtype == "int":
+                # Elements are ints already: int(x) would be a no-op
+                return [map_func(x) for x in lst]
+            return [map_func(x) for x in map(int, lst)]
+        except Exception:
+            # Find the offending element to report it
+            for x in lst:
+                try:
+                    map_func(int(x))
+                except Exception as e:
+                    raise Exception(f"Error evaluating map expression '{expr_code}' with x={x}: {e}")
+            raise
+
+    def run_pipeline(self, lst, stages, func):
+        """
+        Stream lst through FILTER/MAP stages in a single pass. Reduces the
+        stream with the STAT func, or collects it into a list if func is None.
+        """
+        values = iter(lst)
+        
+        for stage in stages:
+            if stage[0] == "FILTER":
+                _, op, val = stage
+                compare = COMPARISON_OPERATORS.get(op)
+                if compare is None:
+                    values = filter(compile_predicate(op, val), values)
+                else:
+                    values = _filter_stage(values, compare, val)
+            else:
+                _, expr_code = stage
+                values = _map_stage(values, compile_map_expr(expr_code), expr_code)
         
-    #     elif func == "median":
-    #         s = sorted(lst)
-    #         n = len(s)
-    #         if n % 2 == 1:
-    #             return s[n // 2]
-    #         return (s[n // 2 - 1] + s[n // 2]) / 2
+        if func is None:
+            return self.make_list(list(values))
+        return self.stream_stat(func, values)
+
+    def stream_stat(self, func, values):
+        """Compute a streaming statistic over an iterator (no list is built)"""
+        if func == "count":
+            return sum(1 for _ in values)
         
-    #     elif func == "variance":
-    #         mean = sum(lst) / len(lst)
-    #         return sum((x - mean) ** 2 for x in lst) / len(lst)
+        if func == "sum":
+            return sum(values)
         
-    #     elif func == "std":
-    #         mean = sum(lst) / len(lst)
-    #         var = sum((x - mean) ** 2 for x in lst) / len(lst)
-    #         return math.sqrt(var)
+        if func == "min":
+            result = min(values, default=None)
+        elif func == "max":
+            result = max(values, default=None)
+        elif func in ("mean", "variance", "std"):
+            return self.stats_from_summary((func,), summarize(values))[0]
+        else:
+            raise Exception(f"Unknown statistical function: {func}")
         
-    #     else:
-    #         raise Exception(f"Unknown statistical function: {func}")
+        if result is None:
+            raise Exception(f"Cannot compute {func} on empty list")
+        return result
 
-    def compute_stat(self, func, lst):
-        """Compute statistical function on list"""
+    def compute_stat(self, func, lst, arg=None, order=None):
+        """
+        Compute statistical function on list.
+        arg is the position for percentile (0-100) / quantile (0-1);
+        order ('asc' / 'desc') is passed when lst is known to be sorted.
+        """
 
         # Functions that work on empty list
         if func == "count":
@@ -325,37 +616,104 @@ class Executor:
             return sum(lst)
 
         # If empty and function requires data, throw error
-        if not lst:
+        if not len(lst):
             raise Exception(f"Cannot compute {func} on empty list")
 
         if func == "mean":
             return sum(lst) / len(lst)
         
         elif func == "min":
-            return min(lst)
+            return self.order_stat(lst, 0, order) if order else min(lst)
         
         elif func == "max":
-            return max(lst)
+            return self.order_stat(lst, len(lst) - 1, order) if order else max(lst)
         
         elif func == "median":
-            s = sorted(lst)
-            n = len(s)
+            n = len(lst)
             if n % 2 == 1:
-                return s[n // 2]
-            return (s[n // 2 - 1] + s[n // 2]) / 2
+                return self.order_stat(lst, n // 2, order)
+            lower, upper = self.order_stat(lst, n // 2 - 1, order, pair=True)
+            return (lower + upper) / 2
         
-        elif func == "variance":
-            mean = sum(lst) / len(lst)
-            return sum((x - mean) ** 2 for x in lst) / len(lst)
+        elif func in ("percentile", "quantile"):
+            return self.quantile_of(lst, arg / 100 if func == "percentile" else arg, order)
         
-        elif func == "std":
-            mean = sum(lst) / len(lst)
-            var = sum((x - mean) ** 2 for x in lst) / len(lst)
-            return math.sqrt(var)
+        elif func in ("variance", "std"):
+            return self.stats_from_summary((func,), summarize(lst))[0]
         
         else:
             raise Exception(f"Unknown statistical function: {func}")
 
+    def quantile_of(self, lst, q, order=None):
+        """q-th quantile (0-1) with linear interpolation between order statistics"""
+        rank = q * (len(lst) - 1)
+        lo = int(rank)
+        frac = rank - lo
+        if frac == 0:
+            return self.order_stat(lst, lo, order)
+        lower, upper = self.order_stat(lst, lo, order, pair=True)
+        return lower + (upper - lower) * frac
+
+    def order_stat(self, lst, k, order=None, pair=False):
+        """
+        k-th smallest element (0-based), plus the (k+1)-th if pair is set.
+        O(1) on a list known to be sorted, average O(n) selection otherwise.
+        """
+        if order == "asc":
+            return (lst[k], lst[k + 1]) if pair else lst[k]
+        if order == "desc":
+            n = len(lst)
+            return (lst[n - 1 - k], lst[n - 2 - k]) if pair else lst[n - 1 - k]
+        return select_kth(lst, k, pair)
+
+    def compute_stats(self, funcs, lst, order=None):
+        """
+        Compute several statistical functions of lst from one streaming pass.
+        Parameterized functions are given as (func, arg) pairs.
+        """
+        # Order statistics (and min/max of a sorted list) are looked up in
+        # the values themselves, everything else comes from the summary
+        if all(self.is_lookup_stat(stat_func(spec), order) for spec in funcs):
+            return self.stats_from_summary(funcs, None, lst, order)
+        return self.stats_from_summary(funcs, summarize(lst), lst, order)
+
+    def is_lookup_stat(self, func, order):
+        """Whether func is answered from the values rather than a summary"""
+        return func in ORDER_STATS or (order is not None and func in ("min", "max"))
+
+    def stats_from_summary(self, funcs, summary, lst=None, order=None):
+        """Derive statistics from a (count, sum, min, max, m2) summary"""
+        results = []
+        
+        for spec in funcs:
+            func = stat_func(spec)
+            
+            if lst is not None and (summary is None or self.is_lookup_stat(func, order)):
+                arg = spec[1] if isinstance(spec, tuple) else None
+                results.append(self.compute_stat(func, lst, arg, order))
+                continue
+            
+            n, total, low, high, m2 = summary
+            if func == "count":
+                results.append(n)
+            elif func == "sum":
+                results.append(total)
+            elif not n and func in ("mean", "min", "max", "variance", "std"):
+                raise Exception(f"Cannot compute {func} on empty list")
+            elif func == "mean":
+                results.append(total / n)
+            elif func == "min":
+                results.append(low)
+            elif func == "max":
+                results.append(high)
+            elif func == "variance":
+                results.append(m2 / n)
+            elif func == "std":
+                results.append(math.sqrt(m2 / n))
+            else:
+                raise Exception(f"Unknown statistical function: {func}")
+        
+        return results
 
     def set_operation(self, op, a, b):
         """Perform set operation on two lists"""
@@ -375,6 +733,22 @@ class Executor:
         else:
             raise Exception(f"Unknown set operation: {op}")
 
+    # ------------------------------------------------------
+    # STORAGE HOOKS (overridden by the array backend)
+    # ------------------------------------------------------
+
+    def make_list(self, values):
+        """Build runtime list storage from a Python list of numbers"""
+        return values
+
+    def is_list(self, value):
+        """Check if a runtime value is list storage"""
+        return isinstance(value, list)
+
+    def to_output(self, value):
+        """Convert a runtime value to the plain Python value that gets printed"""
+        return value
+
     # ------------------------------------------------------
     # UTILITY
     # ------------------------------------------------------
@@ -387,4 +761,255 @@ class Executor:
                 print(f"{name} = {value}")
             else:
                 print(f"{name} = {value}")
-        print("==================\n")
\ No newline at end of file
+        print("==================\n")
+
+# ==========================================================
+# ARRAY BACKEND (NumPy)
+# ==========================================================
+
+class ArrayExecutor(Executor):
+    """
+    Executor whose memory holds contiguous int64/float64 NumPy arrays.
+
+    FILTER, MAP, SORT, LISTOP and STAT run as whole-array kernels. Printed
+    values are converted back with tolist(), so output matches the list
+    backend. Set operations that mix ints and floats keep an object array
+    so elements print exactly as in the list backend. Known differences:
+    int64 arithmetic wraps instead of growing, and float sums use pairwise
+    summation.
+    """
+
+    # make_list builds a new array from a TAC literal
+    copies_literals = True
+
+    def __init__(self, tac, symbol_table=None, output=None):
+        if np is None:
+            raise Exception("The array backend requires numpy (pip install numpy)")
+        super().__init__(tac, symbol_table, output)
+
+    # ---------- Storage hooks ----------
+
+    def make_list(self, values):
+        if isinstance(values, np.ndarray):
+            return values
+        if not values:
+            return np.empty(0, dtype=np.float64)
+        return np.asarray(values)
+
+    def is_list(self, value):
+        return isinstance(value, np.ndarray)
+
+    def to_output(self, value):
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        return value
+
+    def scalar(self, value):
+        """Unwrap a NumPy scalar to the equivalent Python number"""
+        return value.item() if isinstance(value, np.generic) else value
+
+    def as_array(self, value):
+        """Convert an operand (array, literal list or scalar) to an array"""
+        if isinstance(value, np.ndarray):
+            return value
+        if isinstance(value, list):
+            return self.make_list(value)
+        return np.asarray([value])
+
+    # ---------- Kernels ----------
+
+    def filter_values(self, lst, op, val):
+        compare = COMPARISON_OPERATORS.get(op)
+        if compare is not None:
+            return lst[compare(lst, val)]
+        if lst.dtype == object:
+            # Ints and floats of a set operation: test element by element
+            test = compile_predicate(op, val)
+            return lst[np.fromiter(map(test, lst), dtype=bool, count=len(lst))]
+        # One mask for the whole predicate
+        return lst[compile_predicate(op, val, vectorized=True)(lst)]
+
+    def filter_sorted(self, lst, op, val, order):
+        if op not in COMPARISON_OPERATORS:
+            return super().filter_sorted(lst, op, val, order)
+        
+        # Search the ascending view of a descending array, then flip back
+        if order == "desc":
+            return self.filter_sorted(lst[::-1], op, val, "asc")[::-1]
+        
+        left, right = np.searchsorted(lst, val, side="left"), np.searchsorted(lst, val, side="right")
+        
+        if op == ">":
+            return lst[right:]
+        if op == ">=":
+            return lst[left:]
+        if op == "<":
+            return lst[:left]
+        if op == "<=":
+            return lst[:right]
+        if op == "==":
+            return lst[left:right]
+        return np.concatenate((lst[:left], lst[right:]))  # !=
+
+    def sort_values(self, lst, order):
+        result = np.sort(lst)
+        if order == "desc":
+            result = result[::-1]
+        return result
+
+    def sort_in_place(self, lst, order):
+        if lst.base is not None or not lst.flags.writeable:
+            # A view (e.g. of a sorted FILTER): its memory belongs to another array
+            return self.sort_values(lst, order)
+        lst.sort()
+        if order == "desc":
+            return lst[::-1]
+        return lst
+
+    def map_values(self, lst, expr_code, dtype=None):
+        map_func = compile_map_expr(expr_code)
+        if lst.dtype == np.float64 and not np.isfinite(lst).all():
+            # int() of inf / nan fails: report it as the list backend does
+            return self.make_list(super().map_values(lst.tolist(), expr_code))
+        # int(x) semantics of the list backend: truncate toward zero
+        values = lst if lst.dtype == np.int64 else lst.astype(np.int64)
+        try:
+            with np.errstate(all='raise'):
+                result = map_func(values)
+        except Exception:
+            # Re-run element by element: reproduces the exact result of the
+            # list backend (e.g. float overflow) or its exact error message
+            return self.make_list(super().map_values(lst.tolist(), expr_code))
+
+        if np.ndim(result) == 0:
+            # Expression does not depend on x (e.g. folded to a constant)
+            return np.full(len(lst), result)
+        if result is lst:
+            # Identity map of an int array: never share the source
+            return result.copy()
+        return result
+
+    def element_wise_op(self, op, left, right, dtype=None):
+        func = LIST_OPERATORS.get(op)
+        if func is None:
+            raise Exception(f"Unknown list operator: {op}")
+
+        a = self.as_array(left)
+        b = self.as_array(right)
+
+        # Same broadcasting rules as the list backend
+        if not ((len(a) == 1 and len(b) > 1) or (len(b) == 1 and len(a) > 1)):
+            if len(a) != len(b):
+                raise Exception(f"List length mismatch: {len(a)} vs {len(b)}")
+
+        if op == '/' and (b == 0).any():
+            raise Exception("Division by zero")
+        if op == '%' and (b == 0).any():
+            raise Exception("Modulo by zero")
+
+        if op in ('and', 'or', 'xor'):
+            # The arrays carry their dtype: only float arrays are converted
+            a = a if a.dtype == np.int64 else a.astype(np.int64)
+            b = b if b.dtype == np.int64 else b.astype(np.int64)
+            func = {'and': np.bitwise_and, 'or': np.bitwise_or, 'xor': np.bitwise_xor}[op]
+
+        with np.errstate(all='ignore'):
+            return func(a, b)
+
+    def compute_stat(self, func, lst, arg=None, order=None):
+        n = len(lst)
+
+        if func == "sum":
+            return self.scalar(lst.sum()) if n else 0
+
+        if not n or func == "count" or self.is_lookup_stat(func, order):
+            # Empty-list errors and order statistics are shared with the list
+            # backend (order_stat uses np.partition here)
+            return super().compute_stat(func, lst, arg, order)
+
+        if func == "mean":
+            return self.scalar(lst.sum()) / n
+
+        elif func == "min":
+            return self.scalar(lst.min())
+
+        elif func == "max":
+            return self.scalar(lst.max())
+
+        elif func in ("variance", "std"):
+            return self.compute_stats((func,), lst)[0]
+
+        else:
+            raise Exception(f"Unknown statistical function: {func}")
+
+    def order_stat(self, lst, k, order=None, pair=False):
+        n = len(lst)
+        if order == "asc":
+            idx = (k, k + 1)
+        elif order == "desc":
+            idx = (n - 1 - k, n - 2 - k)
+        else:
+            # Introselect: average linear time, no full sort
+            lst = np.partition(lst, (k, k + 1) if pair else k)
+            idx = (k, k + 1)
+        
+        if pair:
+            return self.scalar(lst[idx[0]]), self.scalar(lst[idx[1]])
+        return self.scalar(lst[idx[0]])
+
+    def run_pipeline(self, lst, stages, func):
+        # Whole-array stages; intermediates are dropped as soon as the next
+        # stage has consumed them
+        for stage in stages:
+            if stage[0] == "FILTER":
+                lst = self.filter_values(lst, stage[1], stage[2])
+            else:
+                lst = self.map_values(lst, stage[1])
+        
+        if func is None:
+            return lst
+        return self.compute_stat(func, lst)
+
+    def compute_stats(self, funcs, lst, order=None):
+        n = len(lst)
+        total = self.scalar(lst.sum()) if n else 0
+        low = high = None
+        m2 = 0.0
+        
+        if n:
+            # min / max of a sorted array are read by index in stats_from_summary
+            if "min" in funcs and order is None:
+                low = self.scalar(lst.min())
+            if "max" in funcs and order is None:
+                high = self.scalar(lst.max())
+            if "variance" in funcs or "std" in funcs:
+                m2 = self.scalar(((lst - total / n) ** 2).sum())
+        
+        return self.stats_from_summary(funcs, (n, total, low, high, m2), lst, order)
+
+    def set_operation(self, op, a, b):
+        # Set semantics (ordering, de-duplication) follow the list backend
+        a = a.tolist() if isinstance(a, np.ndarray) else a
+        b = b.tolist() if isinstance(b, np.ndarray) else b
+        result = super().set_operation(op, a, b)
+        if len({type(v) for v in result}) > 1:
+            return np.array(result, dtype=object)
+        return self.make_list(result)
+
+
+# Selectable execution backends
+EXECUTOR_BACKENDS = {
+    "list": Executor,
+    "array": ArrayExecutor,
+}
+
+
+def create_executor(tac, symbol_table=None, backend="list", output=None):
+    """
+    Create an executor for the given backend name ('list' or 'array').
+    output is the PRINT sink (see make_output_sink).
+    """
+    executor_cls = EXECUTOR_BACKENDS.get(backend)
+    if executor_cls is None:
+        raise Exception(f"Unknown execution backend: {backend}")
+    return executor_cls(tac, symbol_table, output)
@@ -1,8 +1,10 @@
+import re
 from typing import List
 from parser import (
     ListDecl, FilterStmt, SortStmt, MapStmt, StatStmt, PrintStmt,
-    SetOpStmt, ListOpStmt, BinOp, UnaryOp, Number, Var
+    SetOpStmt, ListOpStmt
 )
+from map_expressions import expr_to_code
 
 class TACGenerator:
     def __init__(self):
@@ -110,15 +112,18 @@ class TACGenerator:
         dest = self.new_temp()
         
         # Convert expression to evaluable code
-        expr_code = self.expr_to_code(node.expr)
+        expr_code = expr_to_code(node.expr)
         
         self.instructions.append(('MAP', dest, node.list_name, expr_code))
         return dest
 
     def visit_StatStmt(self, node):
-        """Handle: mean list_name, sum list_name, etc."""
+        """Handle: mean list_name, sum list_name, percentile list_name 90, etc."""
         dest = self.new_temp()
-        self.instructions.append(('STAT', dest, node.func, node.list_name))
+        if node.arg is None:
+            self.instructions.append(('STAT', dest, node.func, node.list_name))
+        else:
+            self.instructions.append(('STAT', dest, node.func, node.list_name, node.arg))
         return dest
 
     def visit_PrintStmt(self, node):
@@ -154,74 +159,33 @@ class TACGenerator:
         return dest
 
     def visit_ListOpStmt(self, node):
-        """Handle: a + b * 2, flags or 8, etc."""
-        dest = self.new_temp()
-        
-        # Get left operand
-        if isinstance(node.left, str):
-            left = node.left
-        elif isinstance(node.left, (int, float)):
-            left = node.left
-        elif isinstance(node.left, list):
-            left = node.left
-        elif isinstance(node.left, ListOpStmt):
-            left = self.visit_ListOpStmt(node.left)
-        else:
-            left = self.visit(node.left)
-        
-        # Get right operand
-        if isinstance(node.right, str):
-            right = node.right
-        elif isinstance(node.right, (int, float)):
-            right = node.right
-        elif isinstance(node.right, list):
-            right = node.right
-        elif isinstance(node.right, ListOpStmt):
-            right = self.visit_ListOpStmt(node.right)
-        else:
-            right = self.visit(node.right)
-        
-        self.instructions.append(('LISTOP', dest, node.op, left, right))
-        return dest
-
-    # ---------- Expression handling (for map statements) ----------
-    
-    def expr_to_code(self, expr):
         """
-        Convert expression AST to evaluable Python code string.
-        Used for map expressions like: $0 * 2 + 5
-        """
-        
-        if isinstance(expr, Number):
-            # Render as integer if it's a whole number
-            if isinstance(expr.value, float) and expr.value.is_integer():
-                return str(int(expr.value))
-            return str(expr.value)
-        
-        if isinstance(expr, Var):
-            # $0 becomes 'x' in the evaluable code (will be replaced at runtime)
-            return 'x'
+        Handle: a + b * 2, flags or 8, etc.
         
-        if isinstance(expr, UnaryOp):
-            operand = self.expr_to_code(expr.expr)
-            return f"(-{operand})"
-        
-        if isinstance(expr, BinOp):
-            left = self.expr_to_code(expr.left)
-            right = self.expr_to_code(expr.right)
+        Nested operations are walked with an explicit stack, so chains of
+        thousands of terms do not recurse. Temps are numbered as by a
+        recursive walk: an operation's dest before its operands'.
+        """
+        stack = [(node, self.new_temp(), [])]  # (operation, dest, operand values)
+        while True:
+            node, dest, operands = stack[-1]
             
-            # Convert bitwise operators to Python equivalents
-            op = expr.op
-            if op == 'and':
-                op = '&'
-            elif op == 'or':
-                op = '|'
-            elif op == 'xor':
-                op = '^'
+            # Get left operand, then right operand
+            if len(operands) < 2:
+                operand = node.right if operands else node.left
+                if isinstance(operand, ListOpStmt):
+                    stack.append((operand, self.new_temp(), []))
+                elif isinstance(operand, (str, int, float, list)):
+                    operands.append(operand)
+                else:
+                    operands.append(self.visit(operand))
+                continue
             
-            return f"({left} {op} {right})"
-        
-        raise Exception(f"Unknown expression type: {type(expr).__name__}")
+            self.instructions.append(('LISTOP', dest, node.op, operands[0], operands[1]))
+            stack.pop()
+            if not stack:
+                return dest
+            stack[-1][2].append(dest)
 
     # ---------- Utility ----------
     
@@ -229,4 +193,52 @@ class TACGenerator:
     def pretty_print(tac_list):
         """Pretty print TAC instructions"""
         for i, instr in enumerate(tac_list, 1):
-            print(f"{i:03}: {instr}")
\ No newline at end of file
+            print(f"{i:03}: {instr}")
+
+
+# ---------- TAC def/use helpers ----------
+
+# Names of the temps made by TACGenerator.new_temp
+TEMP_NAME = re.compile(r"t\d+")
+
+
+def is_temp(name):
+    """True for a compiler temp (t1, t2, ...), False for a user variable"""
+    return TEMP_NAME.fullmatch(name) is not None
+
+
+def tac_reads(instr):
+    """Names (variables/temps) read by a TAC instruction"""
+    opcode = instr[0]
+
+    if opcode in ("LIST", "COPY"):
+        # ('LIST', name, source) / ('COPY', dest, src)
+        return [instr[2]] if isinstance(instr[2], str) else []
+
+    if opcode in ("FILTER", "MAP", "FUSED"):
+        # ('FILTER', dest, src, op, value) / ('MAP', dest, src, expr)
+        # ('FUSED', dest, src, stages, func)
+        return [instr[2]]
+
+    if opcode in ("STAT", "STATS"):
+        # ('STAT', dest, func, list_name) / ('STATS', dests, funcs, list_name)
+        return [instr[3]]
+
+    if opcode in ("SETOP", "LISTOP"):
+        # ('SETOP' | 'LISTOP', dest, op, left, right)
+        return [v for v in instr[3:5] if isinstance(v, str)]
+
+    if opcode in ("SORT", "PRINT"):
+        # ('SORT', name, order) reads and writes name / ('PRINT', target)
+        return [instr[1]]
+
+    return []
+
+
+def tac_writes(instr):
+    """Names (variables/temps) written by a TAC instruction"""
+    if instr[0] == "PRINT":
+        return []
+    if instr[0] == "STATS":
+        return list(instr[1])
+    return [instr[1]]
\ No newline at end of file
@@ -1,4 +1,6 @@
+import bisect
 import re
+from array import array
 from collections import namedtuple
 
 Token = namedtuple('Token', ['type', 'value', 'line', 'col'])
@@ -28,55 +30,211 @@ TOKEN_REGEX = re.compile(r"""
     (?P<NEWLINE>\r?\n+)                    
 """, re.VERBOSE)
 
+# Bulk literal arrays: "[" numbers, commas and whitespace "]" (a flat
+# character class, so the regex engine keeps no per-element state)
+NUMARRAY_REGEX = re.compile(r"\[[-\d., \t\r\n]*\]")
+# Not lexed as NUMBERs / whitespace: a '.' without digits on both
+# sides (1. / .5), a '\r' outside of '\r\n'
+INVALID_IN_NUMARRAY = re.compile(r"(?<!\d)\.|\.(?!\d)|\r(?!\n)")
+
 # Keywords that become specific token types
 KEYWORDS = {
     'list', 'filter', 'sort', 'asc', 'desc', 'map', 'print',
     'mean', 'sum', 'median', 'variance', 'std', 'min', 'max', 'count',
+    'percentile', 'quantile',
     'union', 'intersection', 'difference',
+    'between',  # filter x between 3 and 10
     'and', 'or', 'xor'  # logical/bitwise operators
 }
 
 
-def lex(source):
-    tokens = []
+def lex_numarray(source, start):
+    """
+    Lex the literal array at source[start] ('[') as one NUMARRAY token
+    value: array('d') of all its numbers, converted in one pass. Returns
+    (numbers, end), or None when it holds anything but NUMBERs separated
+    by commas - it is then lexed token by token, with the usual errors.
+    """
+    mo = NUMARRAY_REGEX.match(source, start)
+    if mo is None:
+        return None
+    body = source[start + 1:mo.end() - 1]
+    if INVALID_IN_NUMARRAY.search(body):
+        return None
+    if not body.strip(' \t\r\n'):
+        return array('d'), mo.end()
+    try:
+        # float() skips the whitespace around each number and rejects
+        # empty elements, lone '-' and runs like '1 2' or '1-2'
+        return array('d', map(float, body.split(','))), mo.end()
+    except ValueError:
+        return None
+
+
+# Token type codes of TokenStream (index in TOKEN_TYPES)
+TOKEN_TYPES = (
+    'EOF', 'KEYWORD', 'ID', 'OP', 'COMP', 'NUMBER', 'NUMARRAY', 'DOLLAR0', 'ARROW',
+    'ASSIGN', 'LBRACK', 'RBRACK', 'LPAREN', 'RPAREN', 'COMMA',
+)
+TYPE_CODES = {name: code for code, name in enumerate(TOKEN_TYPES)}
+EOF_CODE, NUMARRAY_CODE = TYPE_CODES['EOF'], TYPE_CODES['NUMARRAY']
+
+# Characters of a NUMARRAY's source text shown by TokenStream.display()
+NUMARRAY_PREVIEW = 40
+
+
+class TokenStream:
+    """
+    Tokens of one source as parallel arrays: a type code and the start/end
+    offsets of the lexeme in the source per token, plus the offset where
+    each line starts. Values and positions are computed only when a token
+    is read:
+
+        stream[i]  →  Token('ID', 'x', 1, 6)
+
+    so a large script costs 9 bytes per token instead of a tuple and a
+    string each. The Parser reads it like a list of Tokens.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.types = array('B')        # TYPE_CODES
+        self.starts = array('I')       # lexeme = source[start:end]
+        self.ends = array('I')
+        self.line_starts = array('I', [0])  # offset of the first char of each line
+        self.numarrays = {}            # token index -> array('d') of a NUMARRAY
+        self.line = 1                  # line of the last token read
+
+    def append(self, kind, start, end):
+        self.types.append(TYPE_CODES[kind])
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def add_lines(self, start, end):
+        """Record the lines starting after each newline in source[start:end]; returns their count"""
+        count = 0
+        nl = self.source.find('\n', start, end)
+        while nl != -1:
+            self.line_starts.append(nl + 1)
+            count += 1
+            nl = self.source.find('\n', nl + 1, end)
+        return count
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, i):
+        code = self.types[i]  # IndexError past the end, as for a list
+        start = self.starts[i]
+        line_starts = self.line_starts
+        line = self.line
+        if start < line_starts[line - 1]:
+            line = bisect.bisect_right(line_starts, start)
+        else:
+            # Tokens are mostly read in order: move forward from the last line
+            last = len(line_starts)
+            while line < last and line_starts[line] <= start:
+                line += 1
+        self.line = line
+        if code == NUMARRAY_CODE:
+            value = self.numarrays[i]
+        elif code == EOF_CODE:
+            value = None
+        else:
+            value = self.source[start:self.ends[i]]
+        return Token(TOKEN_TYPES[code], value, line, start - line_starts[line - 1] + 1)
+
+    def __iter__(self):
+        for i in range(len(self.types)):
+            yield self[i]
+
+    def display(self):
+        """
+        The tokens as strings, for the lexer phase output. A NUMARRAY shows
+        the start of its source text instead of all of its numbers:
+            Token(type='NUMARRAY', value='[1, 2, 3, ...] (1000 numbers)', line=1, col=10)
+        """
+        shown = []
+        for i, token in enumerate(self):
+            if token.type == 'NUMARRAY':
+                start, end = self.starts[i], self.ends[i]
+                if end - start > NUMARRAY_PREVIEW:
+                    # Cut after the last whole number that fits
+                    cut = self.source.rfind(',', start, start + NUMARRAY_PREVIEW)
+                    text = self.source[start:cut + 1 if cut != -1 else start + NUMARRAY_PREVIEW] + ' ...]'
+                else:
+                    text = self.source[start:end]
+                count = len(token.value)
+                token = token._replace(value=f"{text} ({count} number{'s' if count != 1 else ''})")
+            shown.append(str(token))
+        return shown
+
+
+def lex_stream(source):
+    """Tokenize source into a TokenStream"""
+    tokens = TokenStream(source)
     line, col = 1, 1
     pos = 0  # track current position in source
 
-    for mo in TOKEN_REGEX.finditer(source):
+    while True:
+        mo = TOKEN_REGEX.search(source, pos)
+        if mo is None:
+            break
         if mo.start() > pos:
             # There is unmatched text before this match → invalid lexeme
             invalid_text = source[pos:mo.start()]
             raise SyntaxError(f"Invalid lexeme '{invalid_text}' at line {line}, col {col}")
 
         kind = mo.lastgroup
-        value = mo.group()
+        start, end = mo.span()
+
+        if kind == 'LBRACK':
+            bulk = lex_numarray(source, start)
+            if bulk is not None:
+                numbers, end = bulk
+                tokens.numarrays[len(tokens)] = numbers
+                tokens.append('NUMARRAY', start, end)
+                newlines = tokens.add_lines(start, end)
+                if newlines:
+                    # The array spans lines
+                    line += newlines
+                    col = end - source.rfind('\n', start, end)
+                else:
+                    col += end - start
+                pos = end
+                continue
 
         if kind in ('WS', 'COMMENT'):
             pass
         elif kind == 'NEWLINE':
-            line += value.count('\n')
+            line += tokens.add_lines(start, end)
             col = 1
-            pos = mo.end()
+            pos = end
             continue
         elif kind == 'ID':
-            if value in KEYWORDS:
-                tokens.append(Token('KEYWORD', value, line, col))
+            if mo.group() in KEYWORDS:
+                tokens.append('KEYWORD', start, end)
             else:
-                tokens.append(Token('ID', value, line, col))
+                tokens.append('ID', start, end)
         elif kind in ('PLUS', 'MINUS', 'STAR', 'SLASH', 'MOD'):
-            tokens.append(Token('OP', value, line, col))
+            tokens.append('OP', start, end)
         elif kind in ('GT', 'LT', 'COMP'):
-            tokens.append(Token('COMP', value, line, col))
+            tokens.append('COMP', start, end)
         else:
-            tokens.append(Token(kind, value, line, col))
+            tokens.append(kind, start, end)
 
-        col += len(value)
-        pos = mo.end()  # update position
+        col += end - start
+        pos = end  # update position
 
     if pos < len(source):
         # trailing unmatched text
         invalid_text = source[pos:]
         raise SyntaxError(f"Invalid lexeme '{invalid_text}' at line {line}, col {col}")
 
-    tokens.append(Token('EOF', None, line, col))
+    tokens.append('EOF', pos, pos)
     return tokens
+
+
+def lex(source):
+    """Tokenize source into a list of Token namedtuples"""
+    return list(lex_stream(source))
@@ -0,0 +1,95 @@
+from intermediate_code_generator import tac_reads, tac_writes
+
+
+class Liveness:
+    """
+    Liveness of the variables/temps of a (straight-line) TAC program.
+
+    release[i] holds the names that are never read after instruction i,
+    as (name, owner) pairs, so executors can drop them right away and
+    keep only the live set in memory. owner is False when another live
+    name still aliases the same value (list a = t1): dropping the name
+    does not free the value then.
+
+        ('FILTER', 't1', 'd', '>', 3.0)   release: ('d', True)
+        ('LIST', 'a', 't1')               release: ('t1', False)
+        ('STAT', 't2', 'sum', 'a')        release: ('a', True)
+        ('PRINT', 't2')                   release: ('t2', True)
+
+    The same counts make aliasing copy-on-write: list b = a shares a's
+    storage, and in_place[i] is set for a SORT whose list no other live
+    name holds, so it can be sorted without a copy. It is "literal" when
+    the list is a literal of the TAC itself (which backends may keep by
+    reference, see Executor.copies_literals) and "owned" otherwise.
+    """
+
+    def __init__(self, tac):
+        self.release = [()] * len(tac)
+        self.values = 0      # values (lists/scalars) created by the program
+        self.peak_live = 0   # most values alive at the same time
+        self.in_place = {}   # SORT index -> "owned" / "literal"
+
+        uses = [(tac_reads(instr), tac_writes(instr)) for instr in tac]
+
+        # Backward pass: names not live after each instruction
+        dead_after = [None] * len(tac)
+        live = set()
+        for i in range(len(tac) - 1, -1, -1):
+            reads, writes = uses[i]
+            dead = [name for name in writes if name not in live]
+            for name in reads:
+                if name not in live and name not in writes:
+                    dead.append(name)
+            if dead:
+                dead_after[i] = dead
+            live.difference_update(writes)
+            live.update(reads)
+
+        # Forward pass: which value every name holds, to find owners
+        value_of = {}  # name -> value id
+        holders = {}   # value id -> number of names holding it
+        literals = set()
+        for i, instr in enumerate(tac):
+            for name in uses[i][1]:
+                if instr[0] in ("LIST", "COPY") and isinstance(instr[2], str):
+                    value = value_of.get(instr[2], instr[2])
+                elif instr[0] == "SORT":
+                    # Same value: a sort that copies (or is skipped because
+                    # the list is already sorted) is not told apart here
+                    value = value_of.get(name, name)
+                    if holders.get(value) == 1:
+                        self.in_place[i] = "literal" if value in literals else "owned"
+                else:
+                    if instr[0] in ("LIST", "COPY") and isinstance(instr[2], list):
+                        literals.add((i, name))
+                    value = (i, name)
+                    self.values += 1
+                self._drop(value_of, holders, name)
+                value_of[name] = value
+                holders[value] = holders.get(value, 0) + 1
+
+            if len(holders) > self.peak_live:
+                self.peak_live = len(holders)
+
+            if dead_after[i] is not None:
+                self.release[i] = tuple(
+                    (name, self._drop(value_of, holders, name)) for name in dead_after[i]
+                )
+
+    @staticmethod
+    def _drop(value_of, holders, name):
+        """Unbind name; True when it held the last reference to its value"""
+        value = value_of.pop(name, None)
+        count = holders.get(value)
+        if count is None:
+            return False
+        if count > 1:
+            holders[value] = count - 1
+            return False
+        del holders[value]
+        return True
+
+
+def analyze_liveness(tac):
+    """Liveness of optimized TAC"""
+    return Liveness(tac)
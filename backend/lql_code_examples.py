@@ -69,7 +69,8 @@ print count stats_data
 """
 @ ──────────────────────────────────────────────────────────────────────────
 @ TEST 3: Filter with All Comparison Operators
-@ Grammar: FilterStmt → "filter" ListIdentifier ComparisonOp Number
+@ Grammar: FilterStmt → "filter" ListIdentifier Predicate
+@          Condition → ComparisonOp Number | "between" Number "and" Number
 @          ComparisonOp → "==" | "!=" | ">" | ">=" | "<" | "<="
 @ ──────────────────────────────────────────────────────────────────────────
 list values = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
@@ -95,6 +96,18 @@ print neq_five
 list decimals = filter values > 3.5
 print decimals
 
+list in_range = filter values > 3 and < 8
+print in_range
+
+list outside = filter values < 3 or > 8
+print outside
+
+list between_bounds = filter values between 4 and 6
+print between_bounds
+
+list nested = filter values between 2 and 9 and (<= 3 or >= 8)
+print nested
+
 """
 
 ,
@@ -631,4 +644,64 @@ sort res asc
 
 """
 
-]
\ No newline at end of file
+,
+
+"""
+@ ──────────────────────────────────────────────────────────────────────────
+@ TEST 21: Long Map Chain
+@ A generated map expression 3000 terms deep ($0 + $0 + ... + $0)
+@ ──────────────────────────────────────────────────────────────────────────
+list base = [1, 2, 3]
+list long_chain = map base $0 => """ + " + ".join(["$0"] * 3000) + """
+print long_chain
+print sum long_chain
+"""
+
+,
+
+"""
+@ ──────────────────────────────────────────────────────────────────────────
+@ TEST 22: Statistics Keep Program Order
+@ count e is printed before the map fails; std of the empty list e is
+@ never reached. u mixes ints and floats, so nothing is folded.
+@ ──────────────────────────────────────────────────────────────────────────
+list a = [1, 2, 3]
+list i = map a $0 => $0 * 2
+list u = a union i
+list e = filter u > 50
+print count e
+list m = map a $0 => $0 / 0
+print m
+print std e
+"""
+
+,
+
+"""
+@ ──────────────────────────────────────────────────────────────────────────
+@ TEST 23: Negative Zero
+@ 0 and -0.0 are equal but print differently: 0.0 then -0.0
+@ ──────────────────────────────────────────────────────────────────────────
+list a = [0]
+list b = [-0.0]
+print min a
+print min b
+"""
+
+,
+
+"""
+@ ──────────────────────────────────────────────────────────────────────────
+@ TEST 24: Pushed Filters Keep Map Errors In Order
+@ c holds inf (1e200 * 1e200), so the map fails before print a runs
+@ ──────────────────────────────────────────────────────────────────────────
+list a = [1, 2, 3]
+list b = a * 100000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000.0
+list c = b * 100000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000.0
+list m = map c $0 => $0 * 2 + 1
+print a
+list f = filter m > 5
+print f
+"""
+
+]
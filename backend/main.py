@@ -1,12 +1,42 @@
-from code_executer import Executor
+import argparse
+import io
+import sys
+
+from code_executer import EXECUTOR_BACKENDS, Executor, create_executor
+import bytecode_vm  # registers the "vm" / "vm-array" backends
+import tac_compiler  # registers the "native" backend
 from intermediate_code_generator import TACGenerator
-from lexer import lex
+from lexer import lex_stream
 from optimizer import Optimizer
 from parser import Parser
 from semantic_analyzer import SemanticAnalyzer
 from lql_code_examples import code
+from app.explain import InstructionProfiler, format_plan
+
+arg_parser = argparse.ArgumentParser(description="Run the LQL examples and write every phase to result.txt")
+arg_parser.add_argument("--explain-analyze", action="store_true",
+                        help="profile every executed instruction (time, elements in/out, allocated bytes)")
+arg_parser.add_argument("--check-backends", action="store_true",
+                        help="run the optimized TAC on every backend and compare it with the unoptimized TAC "
+                             "(exit status 1 on a mismatch)")
+args = arg_parser.parse_args()
 
 output_file = "result.txt"
+mismatches = 0
+
+
+def run_program(tac, symbol_table, backend="list", types=None):
+    """(printed output, error message or None) of tac run on a backend"""
+    buffer = io.StringIO()
+    try:
+        exec_engine = create_executor(tac, symbol_table, backend, output=buffer)
+        if types is not None:
+            exec_engine.types = types
+        exec_engine.run()
+    except Exception as e:
+        return buffer.getvalue(), str(e)
+    return buffer.getvalue(), None
+
 
 # open file in write mode every time you run the tests
 with open(output_file, "w", encoding="utf-8") as f:
@@ -20,7 +50,7 @@ with open(output_file, "w", encoding="utf-8") as f:
         f.write(snippet + "\n\n")
 
         # ========== TOKENS ==========
-        tokens = lex(snippet)
+        tokens = lex_stream(snippet)
         f.write("-----------\n TOKENS:\n-----------\n")
         for tok in tokens:
             f.write(str(tok) + "\n")
@@ -31,7 +61,7 @@ with open(output_file, "w", encoding="utf-8") as f:
         parser = Parser(tokens)
         ast = parser.parse()
         for node in ast:
-            f.write(str(node.__dict__) + "\n")
+            f.write(str(node.fields()) + "\n")
         f.write("\n")
 
         # ========== SEMANTIC ANALYSIS ==========
@@ -65,23 +95,47 @@ with open(output_file, "w", encoding="utf-8") as f:
         f.write(snippet + "\n\n")
 
         # Execute and capture printed output
-        exec_engine = Executor(optimized_tac, symbol_table)
-
-        import io, sys
         buffer = io.StringIO()
-        old_stdout = sys.stdout
-        sys.stdout = buffer
-        
+        exec_engine = Executor(optimized_tac, symbol_table, output=buffer)
+        exec_engine.types = optimizer.types
+        if args.explain_analyze:
+            exec_engine.profiler = InstructionProfiler()
         try:
             exec_engine.run()
-        finally:
-            sys.stdout = old_stdout
+            error = None
+        except Exception as e:
+            error = str(e)
 
         exec_output = buffer.getvalue()
 
         f.write("OUTPUT:\n")
         f.write(exec_output + "\n")
+        if error is not None:
+            f.write(f"ERROR: {error}\n\n")
+
+        if args.explain_analyze:
+            f.write("EXPLAIN ANALYZE:\n")
+            f.write(format_plan(exec_engine.profiler.rows) + "\n\n")
+
+        # ========== BACKEND CHECK ==========
+        # Every backend must print what the unoptimized TAC prints, and
+        # fail at the same point with the same error
+        if args.check_backends:
+            f.write("-----------\n BACKEND CHECK:\n-----------\n")
+            expected = run_program(tac, symbol_table)
+            for backend in EXECUTOR_BACKENDS:
+                result = run_program(optimized_tac, symbol_table, backend, optimizer.types)
+                if result == expected:
+                    f.write(f"{backend}: OK\n")
+                else:
+                    mismatches += 1
+                    f.write(f"{backend}: MISMATCH {result!r}, expected {expected!r}\n")
+            f.write("\n")
 
         # ========== END SEPARATOR ==========
         f.write("============================================================================\n")
 
+if args.check_backends:
+    print(f"Backend check: {mismatches} mismatches (see {output_file})")
+    sys.exit(1 if mismatches else 0)
+
@@ -0,0 +1,761 @@
+import ast
+import math
+import operator
+import re
+from functools import lru_cache
+
+from parser import BinOp, UnaryOp, Number, Var
+
+# Compiled MAP expressions kept per process. The cache is module level, so
+# every request served by the same process shares it.
+MAP_EXPR_CACHE_SIZE = 1024
+
+# Names visible to a MAP expression (no builtins)
+SAFE_GLOBALS = {
+    '__builtins__': {},
+    'abs': abs,
+    'min': min,
+    'max': max,
+    'int': int,
+    'float': float
+}
+
+
+@lru_cache(maxsize=MAP_EXPR_CACHE_SIZE)
+def compile_map_expr(expr_code):
+    """
+    Compile a MAP expression from expr_to_code (which uses 'x'
+    as the $0 variable) into a reusable function of x.
+    The string is parsed once; every later call is a plain function call.
+    Code nested deeper than CPython can compile is compiled statement by
+    statement (see compile_flat_map_expr).
+    """
+    if expr_nesting(expr_code) > MAX_EXPR_NESTING:
+        return compile_flat_map_expr(expr_code)
+    try:
+        code = compile(f"lambda x: {expr_code}", "<map>", "eval")
+    except SyntaxError as e:
+        raise Exception(f"Invalid map expression '{expr_code}': {e}")
+    return eval(code, dict(SAFE_GLOBALS))
+
+
+def map_expr_cache_info():
+    """Hit/miss counters of the compiled expression cache"""
+    return compile_map_expr.cache_info()
+
+
+# ---------- Expression code ----------
+
+# LQL bitwise operators as Python operators
+PYTHON_OPERATORS = {'and': '&', 'or': '|', 'xor': '^'}
+
+
+def expr_to_code(expr):
+    """
+    Convert a MAP expression AST to evaluable Python code, where $0 is 'x'.
+    Used for map expressions like: $0 * 2 + 5  →  ((x * 2) + 5)
+    The tree is walked with an explicit stack (not recursion): machine-
+    generated expressions like $0 + $0 + ... can be thousands deep.
+    """
+    parts = []
+    stack = [expr]  # nodes still to convert and code between them, last first
+    
+    while stack:
+        item = stack.pop()
+        
+        if item.__class__ is str:
+            parts.append(item)
+        
+        elif isinstance(item, Number):
+            # Render as integer if it's a whole number
+            if isinstance(item.value, float) and item.value.is_integer():
+                parts.append(str(int(item.value)))
+            else:
+                parts.append(str(item.value))
+        
+        elif isinstance(item, Var):
+            # $0 becomes 'x' in the evaluable code (will be replaced at runtime)
+            parts.append('x')
+        
+        elif isinstance(item, UnaryOp):
+            stack.extend((")", item.expr, "(-"))
+        
+        elif isinstance(item, BinOp):
+            op = PYTHON_OPERATORS.get(item.op, item.op)
+            stack.extend((")", item.right, f" {op} ", item.left, "("))
+        
+        else:
+            raise Exception(f"Unknown expression type: {type(item).__name__}")
+    
+    return "".join(parts)
+
+
+# ---------- Deep expressions ----------
+#
+# CPython parses and compiles an expression recursively (and allows 200
+# nested parentheses at most), so MAP code nested deeper than
+# MAX_EXPR_NESTING is compiled into one assignment per operation:
+#
+#     (((x + x) + x) + x)   →   def _map(x):
+#                                   _t0 = x + x
+#                                   _t1 = _t0 + x
+#                                   _t2 = _t1 + x
+#                                   return _t2
+#
+# Operations run in the same order, so values and errors are the same.
+# Such expressions are not analyzed or simplified (parse_map_expr).
+
+MAX_EXPR_NESTING = 100
+
+MAP_TOKEN = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][+-]?\d+)?)|([A-Za-z_]\w*)|(\S))")
+
+# Python operator precedence ('neg': unary minus)
+PRECEDENCE = {'|': 1, '^': 2, '&': 3, '+': 4, '-': 4, '*': 5, '/': 5, '%': 5, 'neg': 6}
+
+
+@lru_cache(maxsize=MAP_EXPR_CACHE_SIZE)
+def expr_nesting(expr_code):
+    """Deepest parenthesis nesting of MAP code"""
+    depth = deepest = 0
+    for char in expr_code:
+        if char == '(':
+            depth += 1
+            if depth > deepest:
+                deepest = depth
+        elif char == ')':
+            depth -= 1
+    return deepest
+
+
+def compile_flat_map_expr(expr_code):
+    """
+    Function of x computing MAP code of any nesting depth, parsed with an
+    explicit operator stack and run as a sequence of assignments
+    """
+    lines = []
+    operands = []   # code of the values computed so far: x, numbers, _t<n>
+    operators = []  # pending operators and '('
+    open_parens = 0
+    expect_operand = True
+    
+    def reduce():
+        op = operators.pop()
+        if op == 'neg':
+            code = f"-{operands.pop()}"
+        else:
+            right, left = operands.pop(), operands.pop()
+            code = f"{left} {op} {right}"
+        name = f"_t{len(lines)}"
+        lines.append(f"    {name} = {code}")
+        operands.append(name)
+    
+    try:
+        pos = 0
+        while pos < len(expr_code):
+            mo = MAP_TOKEN.match(expr_code, pos)
+            if mo is None:
+                break  # trailing whitespace
+            pos = mo.end()
+            number, name, symbol = mo.groups()
+            
+            if number is not None or name is not None:
+                if not expect_operand:
+                    raise SyntaxError("operator expected")
+                operands.append(number if number is not None else name)
+                expect_operand = False
+            elif symbol == '(':
+                if not expect_operand:
+                    raise SyntaxError("operator expected")
+                operators.append('(')
+                open_parens += 1
+            elif symbol == ')':
+                if expect_operand or not open_parens:
+                    raise SyntaxError("unexpected ')'")
+                while operators[-1] != '(':
+                    reduce()
+                operators.pop()
+                open_parens -= 1
+            elif symbol == '-' and expect_operand:
+                operators.append('neg')
+            elif symbol in PRECEDENCE and not expect_operand:
+                # Left-associative: equal precedence is reduced first
+                while operators and operators[-1] != '(' and PRECEDENCE[operators[-1]] >= PRECEDENCE[symbol]:
+                    reduce()
+                operators.append(symbol)
+                expect_operand = True
+            else:
+                raise SyntaxError(f"unexpected '{symbol}'")
+        
+        if expect_operand:
+            raise SyntaxError("operand expected")
+        if open_parens:
+            raise SyntaxError("'(' was never closed")
+        while operators:
+            reduce()
+    except SyntaxError as e:
+        raise Exception(f"Invalid map expression '{expr_code}': {e}")
+    
+    source = "def _map(x):\n" + "\n".join(lines) + f"\n    return {operands[0]}\n"
+    namespace = dict(SAFE_GLOBALS)
+    exec(compile(source, "<map>", "exec"), namespace)
+    return namespace['_map']
+
+
+# ---------- Expression trees ----------
+#
+# A MAP expression as nested tuples, so equal subtrees compare (and hash)
+# equal:
+#
+#     X                   the variable x ($0)
+#     ('const', value, r) int or float; r = repr(value) tells 1 from 1.0
+#                         and 0.0 from -0.0, which compare equal
+#     ('neg', operand)
+#     (op, left, right)   op in BINARY_OPERATORS
+#
+#     ((x * x) + (10 + 7))   →   ('+', ('*', X, X), ('+', constant(10), constant(7)))
+
+X = ('x',)
+
+BINARY_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '%': operator.mod,
+    '&': operator.and_,
+    '|': operator.or_,
+    '^': operator.xor,
+}
+
+AST_OPERATORS = {
+    ast.Add: '+',
+    ast.Sub: '-',
+    ast.Mult: '*',
+    ast.Div: '/',
+    ast.Mod: '%',
+    ast.BitAnd: '&',
+    ast.BitOr: '|',
+    ast.BitXor: '^',
+}
+
+# Integers the array backend computes with (int64): larger folded
+# constants are left to runtime
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def constant(value):
+    """Constant tree node"""
+    return ('const', value, repr(value))
+
+
+@lru_cache(maxsize=MAP_EXPR_CACHE_SIZE)
+def parse_map_expr(expr_code):
+    """
+    Tree of a MAP expression, or None when it is not made of x, numbers
+    and the LQL operators. Subexpressions bound with := (see
+    render_map_expr) are expanded back where they are reused.
+    Code nested deeper than MAX_EXPR_NESTING is not analyzed (None).
+    """
+    if expr_nesting(expr_code) > MAX_EXPR_NESTING:
+        return None
+    try:
+        tree = ast.parse(expr_code, mode="eval")
+    except SyntaxError:
+        return None
+    return _from_ast(tree.body)
+
+
+def _from_ast(root):
+    """
+    Tree of an ast node, None when any part is not supported. Nodes are
+    converted children first, left to right, with an explicit stack; a
+    name bound by := is known from the point Python evaluates it.
+    """
+    bound = {}      # names assigned by := so far
+    results = []    # trees of the converted nodes
+    stack = [(root, False)]
+    
+    while stack:
+        node, ready = stack.pop()
+        
+        if isinstance(node, ast.Constant):
+            if type(node.value) not in (int, float):
+                return None
+            results.append(constant(node.value))
+        
+        elif isinstance(node, ast.Name):
+            tree = X if node.id == "x" else bound.get(node.id)
+            if tree is None:
+                return None
+            results.append(tree)
+        
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            if not ready:
+                stack.extend(((node, True), (node.operand, False)))
+            elif isinstance(node.op, ast.USub):
+                results.append(('neg', results.pop()))
+        
+        elif isinstance(node, ast.BinOp):
+            op = AST_OPERATORS.get(type(node.op))
+            if op is None:
+                return None
+            if not ready:
+                # Python evaluates the left operand first: it binds names first
+                stack.extend(((node, True), (node.right, False), (node.left, False)))
+            else:
+                right = results.pop()
+                results.append((op, results.pop(), right))
+        
+        elif isinstance(node, ast.NamedExpr):
+            if not ready:
+                stack.extend(((node, True), (node.value, False)))
+            else:
+                bound[node.target.id] = results[-1]
+        
+        else:
+            return None
+    
+    return results[0]
+
+
+def render_map_expr(tree):
+    """
+    Code of a tree, in the format of expr_to_code. A subtree
+    that occurs more than once is computed once and reused:
+        ((x * x) + ((x * x) * 3))  →  ((_c0 := (x * x)) + (_c0 * 3))
+    """
+    counts = {}
+    _count_subtrees(tree, counts)
+    return _render(tree, counts, {})
+
+
+def _count_subtrees(node, counts):
+    """Occurrences of every compound subtree (not inside a repeated one)"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node[0] in ('x', 'const'):
+            continue
+        if node in counts:
+            counts[node] += 1  # its own subtrees are reused with it
+            continue
+        counts[node] = 1
+        stack.extend(reversed(node[1:]))
+
+
+def _render(node, counts, names):
+    """
+    Code of a tree, written left to right with an explicit stack. A
+    repeated subtree is named once its code is complete, so names are
+    numbered in the order Python evaluates them.
+    """
+    parts = []
+    stack = [node]  # subtrees still to render, code between them, and ('name', subtree, part index)
+    
+    while stack:
+        item = stack.pop()
+        
+        if item.__class__ is str:
+            parts.append(item)
+            continue
+        
+        kind = item[0]
+        if kind == 'name':
+            # ('name', subtree, index of its opening part): bind it with :=
+            _, subtree, index = item
+            name = names[subtree] = f"_c{len(names)}"
+            parts[index] = f"({name} := {parts[index]}"
+            parts.append(")")
+        elif kind == 'x':
+            parts.append('x')
+        elif kind == 'const':
+            value = item[1]
+            negative = value < 0 or (type(value) is float and math.copysign(1.0, value) < 0)
+            parts.append(f"({value!r})" if negative else repr(value))
+        elif item in names:
+            parts.append(names[item])
+        else:
+            if counts.get(item, 0) > 1:
+                stack.append(('name', item, len(parts)))
+            if kind == 'neg':
+                stack.extend((")", item[1], "(-"))
+            else:
+                stack.extend((")", item[2], f" {kind} ", item[1], "("))
+    
+    return "".join(parts)
+
+
+@lru_cache(maxsize=MAP_EXPR_CACHE_SIZE)
+def simplify_map_expr(expr_code):
+    """
+    Optimize a MAP expression as a tree: fold constant subtrees, apply
+    algebraic identities, reassociate integer constants and compute
+    repeated subtrees once:
+        ((x * x) + (10 + 7))        →  ((x * x) + 17)
+        (((x + 1) + 2) * 1)         →  (x + 3)
+        ((x * x) + (x * x))         →  ((x * x) * 2)
+    Every rewrite gives the same values (and errors) as the original on
+    the list backend, where x is an int: identities that do not hold for
+    floats (a + 0 with a = -0.0, a * 0 with a = inf) are applied to
+    int subtrees only, and a subtree is only dropped when it cannot fail.
+    Returns expr_code itself when nothing changes.
+    """
+    tree = parse_map_expr(expr_code)
+    if tree is None:
+        return expr_code
+    simplified = _simplify(tree)
+    code = render_map_expr(simplified)
+    if simplified == tree and '_c' not in code:
+        return expr_code
+    if expr_nesting(code) > MAX_EXPR_NESTING:
+        return expr_code  # := adds parentheses
+    return code
+
+
+def _simplify(node):
+    """Simplified tree: children first (explicit stack), then the rules of _rewrite"""
+    results = []  # simplified subtrees
+    stack = [(node, False)]
+    
+    while stack:
+        node, ready = stack.pop()
+        kind = node[0]
+        if kind in ('x', 'const'):
+            results.append(node)
+        elif not ready:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node[1:]))
+        elif kind == 'neg':
+            results.append(_rewrite(('neg', results.pop())))
+        else:
+            right = results.pop()
+            results.append(_rewrite((kind, results.pop(), right)))
+    
+    return results[0]
+
+
+def _const(node, value=None):
+    """node is the constant value (any constant when value is None), same type"""
+    if node[0] != 'const':
+        return False
+    return value is None or (node[1] == value and type(node[1]) is type(value))
+
+
+def _fold(op, a, b):
+    """Constant tree of op(a, b), or None when it fails or leaves int64 / finite floats"""
+    try:
+        value = BINARY_OPERATORS[op](a, b) if op != 'neg' else -a
+    except Exception:
+        return None  # raised at runtime, as before
+    if type(value) is int and not INT64_MIN <= value <= INT64_MAX:
+        return None
+    if type(value) is float and not math.isfinite(value):
+        return None
+    return constant(value)
+
+
+def _is_safe(node):
+    """An int subtree that cannot raise (so it may be dropped)"""
+    kind = node[0]
+    if kind == 'x':
+        return True
+    if kind == 'const':
+        return type(node[1]) is int
+    if kind == 'neg':
+        return _is_safe(node[1])
+    if kind == '%':
+        return _is_safe(node[1]) and _const(node[2]) and type(node[2][1]) is int and node[2][1] != 0
+    return kind in ('+', '-', '*', '&', '|', '^') and _is_safe(node[1]) and _is_safe(node[2])
+
+
+def _affine_offset(node):
+    """(a, c) when the int subtree node is a + c or a - c for a constant c"""
+    kind = node[0]
+    if kind in ('+', '-') and _const(node[2]) and type(node[2][1]) is int:
+        return node[1], node[2][1] if kind == '+' else -node[2][1]
+    if kind == '+' and _const(node[1]) and type(node[1][1]) is int:
+        return node[2], node[1][1]
+    return None
+
+
+def _offset(a, c):
+    """Tree of a + c for an int subtree a"""
+    if c == 0:
+        return a
+    if c > 0:
+        return ('+', a, constant(c))
+    return ('-', a, constant(-c))
+
+
+def _rewrite(node):
+    """Apply the local rules to a node whose children are simplified"""
+    kind = node[0]
+    
+    if kind == 'neg':
+        a = node[1]
+        if a[0] == 'const':
+            return _fold('neg', a[1], None) or node
+        if a[0] == 'neg':
+            return a[1]  # -(-a)
+        return node
+    
+    a, b = node[1], node[2]
+    if a[0] == 'const' and b[0] == 'const':
+        return _fold(kind, a[1], b[1]) or node
+    
+    int_a, int_b = _dtype(a) == "int", _dtype(b) == "int"
+    
+    if kind == '+':
+        if _const(b, 0) and int_a:
+            return a
+        if _const(a, 0) and int_b:
+            return b
+        if b[0] == 'neg' and (int_a or _dtype(b) == "float"):
+            # a + (-b) is a - b, but not for a = -0.0 and an int b = 0
+            return _rewrite(('-', a, b[1]))
+        if a == b:
+            return _rewrite(('*', a, constant(2)))  # one evaluation of a
+        # Reassociate integer constants: (a + 1) + 2 → a + 3
+        if int_a and int_b:
+            for sub, const in ((a, b), (b, a)):
+                inner = _affine_offset(sub)
+                if inner is not None and _const(const):
+                    return _rewrite_offset(inner[0], inner[1] + const[1]) or node
+    
+    elif kind == '-':
+        if _const(b, 0) and int_a:
+            return a
+        if _const(a, 0) and int_b:
+            return _rewrite(('neg', b))
+        if b[0] == 'neg' and (int_a or _dtype(b) == "float"):
+            return _rewrite(('+', a, b[1]))  # a - (-b), same condition
+        if a == b and int_a and _is_safe(a):
+            return constant(0)
+        if int_a and int_b and _const(b):
+            inner = _affine_offset(a)
+            if inner is not None:
+                return _rewrite_offset(inner[0], inner[1] - b[1]) or node
+    
+    elif kind == '*':
+        for x, y, int_y in ((a, b, int_b), (b, a, int_a)):
+            if _const(x, 1) or (_const(x, 1.0) and _dtype(y) == "float"):
+                return y
+            if _const(x, -1) or (_const(x, -1.0) and _dtype(y) == "float"):
+                return _rewrite(('neg', y))
+            if _const(x, 0) and int_y and _is_safe(y):
+                return x
+        # Reassociate integer constants: (a * 2) * 3 → a * 6
+        if int_a and int_b:
+            for sub, const in ((a, b), (b, a)):
+                if not _const(const) or sub[0] != '*':
+                    continue
+                for inner, factor in ((sub[1], sub[2]), (sub[2], sub[1])):
+                    if _const(factor):
+                        folded = _fold('*', factor[1], const[1])
+                        if folded is not None:
+                            return _rewrite(('*', inner, folded))
+    
+    elif kind == '/':
+        if (_const(b, 1) or _const(b, 1.0)) and _dtype(a) == "float":
+            return a
+    
+    elif kind == '%':
+        if _const(b, 1) and int_a and _is_safe(a):
+            return constant(0)
+    
+    elif kind in ('&', '|', '^'):
+        if int_a and int_b:
+            for x, y in ((a, b), (b, a)):
+                if _const(x, 0):
+                    if kind != '&':
+                        return y  # y | 0, y ^ 0
+                    if _is_safe(y):
+                        return x  # y & 0
+            if a == b and _is_safe(a):
+                return a if kind != '^' else constant(0)
+    
+    return node
+
+
+def _rewrite_offset(a, c):
+    """a + c after reassociation, or None when c leaves int64"""
+    if not INT64_MIN <= c <= INT64_MAX:
+        return None
+    if a[0] == 'const':
+        return _fold('+', a[1], c)
+    return _offset(a, c)
+
+
+# ---------- Monotonicity analysis ----------
+
+def sorted_order(values):
+    """'asc' / 'desc' if values are already sorted (non-strictly), else None"""
+    if all(a <= b for a, b in zip(values, values[1:])):
+        return "asc"
+    if all(a >= b for a, b in zip(values, values[1:])):
+        return "desc"
+    return None
+
+
+
+@lru_cache(maxsize=MAP_EXPR_CACHE_SIZE)
+def map_monotonicity(expr_code):
+    """
+    Direction of a MAP expression as a function of x:
+    1 non-decreasing, -1 non-increasing, 0 constant, None unknown.
+    The executor truncates x with int() first, which is itself
+    non-decreasing, so the result holds for the whole MAP.
+    """
+    tree = parse_map_expr(expr_code)
+    if tree is None:
+        return None
+    return _monotonicity(tree)[0]
+
+
+def map_order(expr_code, order):
+    """
+    Sort order ('asc' / 'desc') of MAP over a list sorted in order,
+    or None when it cannot be proven.
+    """
+    if order is None:
+        return None
+    direction = map_monotonicity(expr_code)
+    if direction is None:
+        return None
+    if direction >= 0:
+        return order
+    return "desc" if order == "asc" else "asc"
+
+
+def _monotonicity(node):
+    """(direction, constant value or None) of an expression tree"""
+    kind = node[0]
+    if kind == 'const':
+        return 0, node[1]
+    
+    if kind == 'x':
+        return 1, None
+    
+    if kind == 'neg':
+        direction, value = _monotonicity(node[1])
+        if direction is None:
+            return None, None
+        return -direction, (None if value is None else -value)
+    
+    left, lvalue = _monotonicity(node[1])
+    right, rvalue = _monotonicity(node[2])
+    if left is None or right is None:
+        return None, None
+    
+    # Constant subexpression: fold it to know its sign
+    if left == 0 and right == 0:
+        if lvalue is None or rvalue is None:
+            return None, None
+        try:
+            return 0, BINARY_OPERATORS[kind](lvalue, rvalue)
+        except Exception:
+            return None, None
+    
+    if kind in ('+', '-'):
+        if kind == '-':
+            right = -right
+        if left == 0 or left == right:
+            return right, None
+        if right == 0:
+            return left, None
+        return None, None  # increasing + decreasing
+    
+    # Scaling by a constant: x * c, c * x, x / c
+    if kind == '*' and (left == 0 or right == 0):
+        direction, factor = (left, rvalue) if right == 0 else (right, lvalue)
+    elif kind == '/' and right == 0:
+        direction, factor = left, rvalue
+    else:
+        return None, None
+    
+    # A zero factor is not folded: inf * 0 is nan for overflowing floats
+    if not factor:
+        return None, None
+    return (direction if factor > 0 else -direction), None
+
+
+# ---------- Element type analysis ----------
+
+@lru_cache(maxsize=MAP_EXPR_CACHE_SIZE)
+def map_dtype(expr_code):
+    """
+    Element type of a MAP expression's results: "int", "float", or None
+    when unknown (or when the expression fails, e.g. float & int).
+    x is always an int (the executor applies int() first).
+    """
+    tree = parse_map_expr(expr_code)
+    if tree is None:
+        return None
+    return _dtype(tree)
+
+
+def _dtype(node):
+    """Element type of an expression tree"""
+    kind = node[0]
+    if kind == 'const':
+        return "float" if isinstance(node[1], float) else "int"
+    
+    if kind == 'x':
+        return "int"
+    
+    if kind == 'neg':
+        return _dtype(node[1])
+    
+    left, right = _dtype(node[1]), _dtype(node[2])
+    if left is None or right is None:
+        return None
+    
+    if kind == '/':
+        return "float"
+    if kind in ('&', '|', '^'):
+        return "int" if left == right == "int" else None
+    return "int" if left == right == "int" else "float"
+
+
+# ---------- Affine analysis ----------
+
+@lru_cache(maxsize=MAP_EXPR_CACHE_SIZE)
+def map_affine(expr_code):
+    """
+    (scale, offset) when a MAP expression is scale * x + offset with int
+    coefficients and scale != 0 ((x * 2) + 1 → (2, 1)), else None.
+    Such a MAP is strictly monotonic and cannot raise on an int x.
+    """
+    tree = parse_map_expr(expr_code)
+    if tree is None:
+        return None
+    affine = _affine(tree)
+    if affine is None or affine[0] == 0:
+        return None
+    return affine
+
+
+def _affine(node):
+    """(scale, offset) of an int affine tree, else None"""
+    kind = node[0]
+    if kind == 'x':
+        return 1, 0
+    if kind == 'const':
+        return (0, node[1]) if type(node[1]) is int else None
+    if kind == 'neg':
+        operand = _affine(node[1])
+        return None if operand is None else (-operand[0], -operand[1])
+    if kind not in ('+', '-', '*'):
+        return None
+    
+    left, right = _affine(node[1]), _affine(node[2])
+    if left is None or right is None:
+        return None
+    if kind == '+':
+        return left[0] + right[0], left[1] + right[1]
+    if kind == '-':
+        return left[0] - right[0], left[1] - right[1]
+    if left[0] and right[0]:
+        return None  # x * x
+    factor, term = (left[1], right) if not left[0] else (right[1], left)
+    return factor * term[0], factor * term[1]
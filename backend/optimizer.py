@@ -1,6 +1,52 @@
+import bisect
+import math
+
+from intermediate_code_generator import is_temp, tac_reads, tac_writes
+from ssa import SSAProgram
+from code_executer import Executor, stat_func
+from map_expressions import map_affine, map_dtype, map_order, simplify_map_expr, sorted_order
+from predicates import merge_predicates, predicate_through_map
+from semantic_analyzer import (
+    literal_shape, scalar_shape, filter_shape, map_shape, listop_shape, setop_shape
+)
+
+# STAT functions that can be computed in one streaming pass (fusion terminals)
+STREAMING_STATS = ('sum', 'count', 'mean', 'min', 'max', 'variance', 'std')
+
+# STAT functions defined on empty lists (the others fail on them)
+EMPTY_SAFE_STATS = ('count', 'sum')
+
+# Instructions that neither print nor fail (on operands the semantic
+# analyzer accepted)
+SILENT_OPCODES = ("LIST", "COPY", "CONST", "FILTER", "SORT", "SETOP")
+
+# Opcodes whose result depends only on their operands, with the slice of
+# the TAC tuple holding their attributes (the rest are dest and operands)
+PURE_OPCODES = {
+    "FILTER": slice(3, None),    # op, value
+    "MAP":    slice(3, None),    # expr
+    "STAT":   slice(2, None, 2), # func[, arg]
+    "SETOP":  slice(2, 3),       # op
+    "LISTOP": slice(2, 3),       # op
+}
+# Instructions the partial evaluator replaces with their result
+FOLDABLE_OPCODES = ("FILTER", "MAP", "SORT", "STAT", "SETOP", "LISTOP")
+# Default budget of partial evaluation: elements read and produced per
+# program, and longest list written into the TAC
+FOLD_BUDGET = 1_000_000
+FOLD_MAX_LENGTH = 10_000
+# Integers the array backend stores without overflow (int64)
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
 class Optimizer:
-    def __init__(self, tac):
+    def __init__(self, tac, fold_budget=FOLD_BUDGET, fold_max_length=FOLD_MAX_LENGTH):
         self.tac = tac
+        self.types = {}  # name -> static shape of its lists (see infer_types)
+        self.fold_budget = fold_budget          # elements partial evaluation may process
+        self.fold_max_length = fold_max_length  # longest folded list kept in the TAC
+        self.fold_spent = 0
+        self.cse_removed = 0  # instructions replaced by common_subexpression_elimination
 
     # -----------------------------------------------------
     # ENTRY POINT
@@ -20,15 +66,21 @@ class Optimizer:
             self.constant_folding()
             self.algebraic_simplification()
             self.strength_reduction()
-            self.dead_code_elimination()
-            self.copy_propagation()
-            self.remove_redundant_operations()
+            self.ssa_passes()  # partial evaluation, copy propagation, CSE, DCE, filter pushdown, ...
             
             changed = (len(self.tac) != old_size)
             passes += 1
         
+        # Fusion and grouping run last: the passes above do not know
+        # FUSED / STATS instructions
+        self.operator_fusion()
+        self.group_statistics()
+        
+        self.types = self.infer_types()
+        
         final_size = len(self.tac)
-        print(f"✓ Optimization complete: {initial_size} → {final_size} instructions ({passes} passes)")
+        print(f"✓ Optimization complete: {initial_size} → {final_size} instructions ({passes} passes, "
+              f"{self.cse_removed} common subexpressions removed)")
         
         return self.tac
 
@@ -36,24 +88,20 @@ class Optimizer:
     # CONSTANT FOLDING for MAP expressions
     # -----------------------------------------------------
     def constant_folding(self):
-        """Fold constant expressions in MAP statements"""
+        """
+        Fold and simplify MAP expressions as trees (map_expressions.py):
+        constant subtrees, algebraic identities, reassociated integer
+        constants and repeated subtrees computed once
+        """
         optimized = []
         
         for instr in self.tac:
             if instr[0] == "MAP":
-                # New format: ('MAP', dest, src, expr_code)
+                # ('MAP', dest, src, expr_code)
                 opcode, dest, src, expr_code = instr
-                
-                # Try evaluating if expression doesn't contain 'x' (the $0 variable)
-                if 'x' not in expr_code:
-                    try:
-                        # Evaluate as Python expression
-                        const_val = eval(expr_code, {"__builtins__": {}})
-                        # Replace with constant
-                        expr_code = str(const_val)
-                        instr = ("MAP", dest, src, expr_code)
-                    except:
-                        pass  # Keep original if evaluation fails
+                simplified = simplify_map_expr(expr_code)
+                if simplified is not expr_code:
+                    instr = ("MAP", dest, src, simplified)
             
             optimized.append(instr)
         
@@ -107,16 +155,11 @@ class Optimizer:
     #     self.tac = optimized
 
     def algebraic_simplification(self):
-        """Simplify algebraic expressions in MAP and LISTOP"""
+        """Simplify LISTOP identities (MAP expressions: see constant_folding)"""
         optimized = []
         
         for instr in self.tac:
-            if instr[0] == "MAP":
-                opcode, dest, src, expr_code = instr
-                expr_code = self._simplify_expr(expr_code)
-                instr = ("MAP", dest, src, expr_code)
-            
-            elif instr[0] == "LISTOP":
+            if instr[0] == "LISTOP":
                 # ('LISTOP', dest, op, left, right)
                 opcode, dest, op, left, right = instr
                 
@@ -156,29 +199,6 @@ class Optimizer:
         
         self.tac = optimized
 
-    def _simplify_expr(self, expr):
-        """Simplify constant subexpressions in MAP expressions"""
-        # x + 0 → x
-        expr = expr.replace('(x + 0)', 'x').replace('(0 + x)', 'x')
-        # x - 0 → x
-        expr = expr.replace('(x - 0)', 'x')
-        # x * 1 → x
-        expr = expr.replace('(x * 1)', 'x').replace('(1 * x)', 'x')
-        # x * 0 → 0
-        expr = expr.replace('(x * 0)', '0').replace('(0 * x)', '0')
-        # x / 1 → x
-        expr = expr.replace('(x / 1)', 'x')
-        # x % 1 → 0
-        expr = expr.replace('(x % 1)', '0')
-        # x & 0 → 0
-        expr = expr.replace('(x & 0)', '0').replace('(0 & x)', '0')
-        # x | 0 → x
-        expr = expr.replace('(x | 0)', 'x').replace('(0 | x)', 'x')
-        # x ^ 0 → x
-        expr = expr.replace('(x ^ 0)', 'x').replace('(0 ^ x)', 'x')
-        
-        return expr
-
     # -----------------------------------------------------
     # STRENGTH REDUCTION
     # -----------------------------------------------------
@@ -208,191 +228,632 @@ class Optimizer:
         self.tac = optimized
 
     # -----------------------------------------------------
-    # DEAD CODE ELIMINATION
+    # SSA PASSES
     # -----------------------------------------------------
-    def dead_code_elimination(self):
-        """Remove instructions that produce unused results"""
-        
-        # Step 1: Find all used variables (backward pass)
-        used = set()
+    def ssa_passes(self):
+        """
+        Run the passes that follow def-use chains on one SSA form of the
+        TAC (ssa.py): they walk use lists instead of rescanning the program.
+        CSE runs after redundant sorts are forwarded, so lists they made
+        equal match; DCE then removes the copies left unused by the others.
+        Predicate pushdown runs on what remains (readers already removed no
+        longer block it), followed by CSE and DCE again for its rewrites.
+        """
+        program = SSAProgram(self.tac)
+        self.partial_evaluation(program)
+        self.copy_propagation(program)
+        self.remove_redundant_operations(program)
+        if self.common_subexpression_elimination(program):
+            self.copy_propagation(program)
+        self.dead_code_elimination(program)
+        if self.predicate_pushdown(program):
+            if self.common_subexpression_elimination(program):
+                self.copy_propagation(program)
+            self.dead_code_elimination(program)
+        self.tac = program.to_tac()
+
+    # -----------------------------------------------------
+    # PARTIAL EVALUATION
+    # -----------------------------------------------------
+    def partial_evaluation(self, program):
+        """
+        Run the instructions whose operands are all known at compile time
+        (literals, and results computed here) and replace them with their
+        result, on the SSA form: a LIST of the values, or a CONST scalar.
+            LIST a [3.0, 1.0, 2.0] ; FILTER t1 a > 1 ; STAT t2 sum t1
+            → LIST a [3.0, 1.0, 2.0] ; LIST t1 [3.0, 2.0] ; CONST t2 5.0
+        Values are computed by the list Executor, so they are exactly the
+        list backend's; an instruction that fails there (stat of an empty
+        list, division by zero...) is left for the executor to report.
+        fold_budget caps the elements read and produced over the whole
+        optimization, fold_max_length the length of a list put into the
+        TAC (a longer result is still used to evaluate later instructions).
+        Runs first, while every instruction still matches its TAC tuple.
+        """
+        values = {}  # register -> value known at compile time
+        names = program.names
+        scratch = Executor([])
         
-        for instr in self.tac:
-            opcode = instr[0]
-            
-            # Track all variables that are READ
-            if opcode == "LIST":
-                # ('LIST', name, source)
-                if len(instr) > 2 and isinstance(instr[2], str):
-                    used.add(instr[2])
-            
-            elif opcode == "FILTER":
-                # ('FILTER', dest, src, op, value)
-                used.add(instr[2])  # src
+        for instr in program.instrs:
+            if instr.removed or instr.dest is None:
+                continue
             
-            elif opcode == "MAP":
-                # ('MAP', dest, src, expr)
-                used.add(instr[2])  # src
-            
-            elif opcode == "SORT":
-                # ('SORT', name, order)
-                used.add(instr[1])  # name (both read and write)
-            
-            elif opcode == "STAT":
-                # ('STAT', dest, func, list_name)
-                used.add(instr[3])  # list_name
-            
-            elif opcode == "PRINT":
-                # ('PRINT', target)
-                used.add(instr[1])  # target
-            
-            elif opcode == "SETOP":
-                # ('SETOP', dest, op, left, right)
-                if isinstance(instr[3], str):
-                    used.add(instr[3])
-                if isinstance(instr[4], str):
-                    used.add(instr[4])
+            memory = {}
+            cost = 0
+            for op in instr.operands:
+                if type(op) is not int:
+                    continue
+                if op not in values:
+                    break
+                value = memory[names[op]] = values[op]
+                if isinstance(value, list):
+                    cost += len(value)
+            else:
+                if self.fold_spent + cost > self.fold_budget:
+                    continue
+                scratch.memory = memory
+                scratch.order = {}
+                try:
+                    scratch.execute(instr.fields)
+                except Exception:
+                    continue  # reported by the executor at runtime
+                
+                value = memory[names[instr.dest]]
+                self.fold_spent += cost + (len(value) if isinstance(value, list) else 1)
+                if not self._is_constant(value):
+                    continue
+                values[instr.dest] = value
+                
+                if instr.opcode in FOLDABLE_OPCODES and not (
+                    isinstance(value, list) and len(value) > self.fold_max_length
+                ):
+                    program.fold(instr, value)
+
+    @staticmethod
+    def _is_constant(value):
+        """
+        value can be put into the TAC: a finite float or an int64, or a
+        list of only one of them (every backend then stores and prints it
+        as the list backend computed it)
+        """
+        if isinstance(value, list):
+            kinds = set(map(type, value))
+            if kinds == {float}:
+                return all(map(math.isfinite, value))
+            if kinds == {int}:
+                return INT64_MIN <= min(value) and max(value) <= INT64_MAX
+            return not kinds
+        if type(value) is float:
+            return math.isfinite(value)
+        return type(value) is int and INT64_MIN <= value <= INT64_MAX
+
+    # -----------------------------------------------------
+    # DEAD CODE ELIMINATION
+    # -----------------------------------------------------
+    def dead_code_elimination(self, program):
+        """
+        Remove instructions that produce unused temps, on the SSA form
+        (ssa.py): a definition is dead when its register has no live uses,
+        and removing it drops the uses of its operands, whose definitions
+        are checked next (worklist) - no rescans of the program.
+        """
+        work = [instr for instr in program.instrs if self._is_dead(program, instr)]
+        
+        while work:
+            instr = work.pop()
+            if instr.removed:
+                continue
+            for reg in program.remove(instr):
+                definition = program.defs[reg]
+                if definition is not None and self._is_dead(program, definition):
+                    work.append(definition)
+
+    @staticmethod
+    def _is_dead(program, instr):
+        """instr only computes a temp that nobody reads"""
+        return (
+            instr.opcode in ("LIST", "COPY", "CONST", "FILTER", "MAP", "STAT", "SETOP", "LISTOP")
+            and not instr.removed
+            and not program.used(instr.dest)
+            and program.is_temp(instr.dest)
+        )
+
+    # -----------------------------------------------------
+    # COPY PROPAGATION
+    # -----------------------------------------------------
+    def copy_propagation(self, program):
+        """
+        Replace copies with direct references where possible, on the SSA
+        form: the uses of a copy (LIST/COPY of a register) move to its
+        source while the source's name still holds that value, i.e. before
+        the name is assigned or sorted again (list a = b; sort b → later
+        uses of a keep a). A SORT keeps its operand: the sorted version is
+        stored under the copy's name.
+        """
+        # Program order: the source of a copy of a copy is already the root
+        for instr in program.instrs:
+            if instr.opcode not in ("LIST", "COPY") or instr.removed:
+                continue
+            src = instr.operands[0]
+            if type(src) is not int:
+                continue  # literal / scalar
             
-            elif opcode == "LISTOP":
-                # ('LISTOP', dest, op, left, right)
-                if isinstance(instr[3], str):
-                    used.add(instr[3])
-                if isinstance(instr[4], str):
-                    used.add(instr[4])
+            limit = program.killed[src]
+            program.replace_uses(
+                instr.dest, src,
+                lambda use: use.opcode != "SORT" and use.index <= limit
+            )
+
+    # -----------------------------------------------------
+    # FILTER MERGING AND PREDICATE PUSHDOWN
+    # -----------------------------------------------------
+    def predicate_pushdown(self, program):
+        """
+        Merge FILTERs and move them ahead of MAPs, on the SSA form, so
+        every step runs on fewer elements:
+          - a FILTER of a FILTER result becomes one FILTER of the first
+            source, with a range predicate (predicates.merge_predicates):
+                FILTER t1 x > 3 ; FILTER t2 t1 < 10
+                → FILTER t2 x and ((>, 3), (<, 10))
+          - a FILTER of an affine MAP result (map_affine) runs before the
+            MAP, on the MAP source, with its thresholds inverted:
+                MAP t1 x ((x * 2) + 1) ; FILTER t2 t1 > 9
+                → FILTER t1 x or ((>=, 5.0), (nonfinite, None)) ; MAP t2 t1 ((x * 2) + 1)
+        Only a temp with no other reader is rewritten (aliases that nobody
+        reads are dropped with it). A moved FILTER is merged and moved
+        again with the FILTERs and MAPs before it. The MAP then runs where
+        the FILTER was, so it is only moved when no statement that prints
+        or fails lies in between: its errors keep their program order.
+        """
+        names, defs, killed = program.names, program.defs, program.killed
+        rewritten = 0
+        # Positions of the instructions that print or can fail
+        loud = [instr.index for instr in program.instrs
+                if not instr.removed and instr.opcode not in SILENT_OPCODES]
+        
+        for instr in program.instrs:
+            if instr.removed or instr.opcode != "FILTER":
+                continue
             
-            elif opcode == "COPY":
-                # ('COPY', dest, src)
-                used.add(instr[2])
+            while type(instr.operands[0]) is int:
+                src = instr.operands[0]
+                source = defs[src]
+                aliases = self._dead_aliases(program, src, instr)
+                if source is None or aliases is None:
+                    break
+                origin = source.operands[0]
+                
+                if source.opcode == "FILTER":
+                    if type(origin) is not int or instr.index > killed[origin]:
+                        break  # the name of the first source no longer holds it
+                    predicate = merge_predicates(source.fields[3:], instr.fields[3:])
+                    for alias in aliases + [source]:
+                        program.remove(alias)
+                    program.replace_uses(src, origin)
+                    program.rewrite(instr, ("FILTER", names[instr.dest], names[origin]) + predicate)
+                    rewritten += 1
+                
+                elif source.opcode == "MAP":
+                    affine = map_affine(source.fields[3])
+                    if affine is None:
+                        break
+                    # x of a MAP with int results needs no int() truncation
+                    int_source = (
+                        type(origin) is int and defs[origin] is not None
+                        and defs[origin].opcode == "MAP" and map_dtype(defs[origin].fields[3]) == "int"
+                    )
+                    predicate = predicate_through_map(instr.fields[3:], *affine, int_source)
+                    if predicate is None:
+                        break
+                    k = bisect.bisect_right(loud, source.index)
+                    if k < len(loud) and loud[k] < instr.index:
+                        break  # the MAP would fail after them
+                    for alias in aliases:
+                        program.remove(alias)
+                    expr_code = source.fields[3]
+                    program.rewrite(source, ("FILTER", names[src], source.fields[2]) + predicate)
+                    program.rewrite(instr, ("MAP", names[instr.dest], names[src], expr_code))
+                    del loud[k - 1]  # the MAP at source.index
+                    bisect.insort(loud, instr.index)
+                    instr = source
+                    rewritten += 1
+                
+                else:
+                    break
         
-        # Step 2: Remove instructions that define temps never used
-        optimized = []
+        return rewritten
+
+    @staticmethod
+    def _dead_aliases(program, reg, reader):
+        """
+        The aliases of temp reg that nobody reads (list a = t1) when reader
+        is the only other instruction reading it, else None
+        """
+        if not program.is_temp(reg):
+            return None
+        aliases = []
+        for use in program.uses[reg]:
+            if use.removed or use is reader:
+                continue
+            if use.opcode in ("LIST", "COPY") and not program.used(use.dest):
+                aliases.append(use)
+            else:
+                return None
+        return aliases
+
+    # -----------------------------------------------------
+    # REMOVE REDUNDANT OPERATIONS
+    # -----------------------------------------------------
+    def remove_redundant_operations(self, program):
+        """
+        Remove redundant sorts and copies, on the SSA form. The order each
+        register is provably sorted in is tracked in program order; a SORT
+        of a register already sorted that way (an earlier identical sort, a
+        sorted literal, a filter of a sorted list...) and list x = x / COPY
+        t1 t1 (added by algebraic simplification) are forwarded: their uses
+        read the operand instead.
+        """
+        known_order = {}  # register -> order its list is provably sorted in
+        names = program.names
         
-        for instr in self.tac:
-            opcode = instr[0]
+        for instr in program.instrs:
+            if instr.removed or instr.dest is None:
+                continue
+            opcode, src = instr.opcode, instr.operands[0]
             
-            # Check if this instruction produces a dead temp
-            if opcode in ("FILTER", "MAP", "STAT", "SETOP", "LISTOP", "COPY"):
-                dest = instr[1]
-                # If destination is a temp and never used, skip this instruction
-                if dest.startswith("t") and dest not in used:
-                    continue
+            if opcode == "SORT" and known_order.get(src) == instr.fields[2]:
+                program.forward(instr)  # Redundant sort
+            elif opcode in ("LIST", "COPY") and type(src) is int and names[src] == names[instr.dest]:
+                program.forward(instr)  # Identity copy
+            else:
+                order = self._register_order(instr, known_order)
+                if order:
+                    known_order[instr.dest] = order
+
+    @staticmethod
+    def _register_order(instr, known_order):
+        """Compile-time sort order of the list an SSA instruction defines"""
+        opcode, src = instr.opcode, instr.operands[0]
+        
+        if opcode == "SORT":
+            return instr.fields[2]
+        if opcode in ("LIST", "COPY"):
+            if type(src) is int:
+                return known_order.get(src)
+            if isinstance(src.value, list):
+                return sorted_order(src.value)
+            return "asc"  # scalar: one-element list
+        if opcode == "FILTER":
+            # Filtering keeps the order of the source
+            return known_order.get(src)
+        if opcode == "MAP":
+            return map_order(instr.fields[3], known_order.get(src))
+        return None
+
+    # -----------------------------------------------------
+    # COMMON SUBEXPRESSION ELIMINATION
+    # -----------------------------------------------------
+    def common_subexpression_elimination(self, program):
+        """
+        Eliminate redundant computations, on the SSA form. Instructions are
+        keyed on opcode, attributes and operand values (not the dest): a
+        repeated FILTER / MAP / STAT / SETOP / LISTOP becomes a COPY of the
+        first result, which copy propagation and DCE then remove:
+            FILTER t1 a > 5 ; ... ; FILTER t3 a > 5  →  ... ; COPY t3 t1
+        An operand is keyed by the value it holds: aliases (list b = a)
+        match the list itself, and a SORT defines a new register, so
+        computations on the list before the sort no longer match. The
+        first result is only reused while its name still holds it.
+        Returns the number of instructions replaced.
+        """
+        computed = {}  # key -> register of the first result
+        root = {}      # register -> register of the value it aliases
+        killed = program.killed
+        removed = 0
+        
+        for instr in program.instrs:
+            if instr.removed or instr.dest is None:
+                continue
+            opcode = instr.opcode
             
-            elif opcode == "LIST":
-                # ('LIST', name, source)
-                name = instr[1]
-                if name.startswith("t") and name not in used:
-                    continue
+            if opcode in ("LIST", "COPY"):
+                src = instr.operands[0]
+                if type(src) is int:
+                    root[instr.dest] = root.get(src, src)
+                continue
+            attributes = PURE_OPCODES.get(opcode)
+            if attributes is None:
+                continue
             
-            optimized.append(instr)
+            key = [opcode, instr.fields[attributes]]
+            for op in instr.operands:
+                if type(op) is int:
+                    key.append(root.get(op, op))
+                elif isinstance(op.value, list):
+                    key.append(("literal", id(op.value)))  # the same literal
+                else:
+                    key.append(("const", repr(op.value)))
+            key = tuple(key)
+            prev = computed.get(key)
+            if prev is not None and instr.index <= killed[prev]:
+                program.make_copy(instr, prev)
+                root[instr.dest] = root.get(prev, prev)
+                removed += 1
+            else:
+                computed[key] = instr.dest
         
-        self.tac = optimized
+        self.cse_removed += removed
+        return removed
 
     # -----------------------------------------------------
-    # COPY PROPAGATION
+    # OPERATOR FUSION
     # -----------------------------------------------------
-    def copy_propagation(self):
-        """Replace copies with direct references where possible"""
-        
-        # Build copy mapping: dest -> src for simple copies
-        copies = {}
+    def operator_fusion(self):
+        """
+        Fuse linear FILTER/MAP chains, optionally ending in a streaming STAT,
+        into one ('FUSED', dest, src, stages, func) instruction:
+            FILTER t1 d > 3 ; MAP t2 t1 (x*2) ; STAT t3 sum t2
+            → FUSED t3 d (('FILTER', '>', 3), ('MAP', '(x * 2)')) sum
+        A chain only continues through a temp whose single reader is the
+        next step, so no intermediate list is ever materialized.
+        func is None when the chain ends in a list instead of a STAT.
+        The FUSED instruction runs where the chain ends; once the chain
+        holds a MAP (which can fail) it does not continue past other
+        statements, so errors are still raised in program order.
+        """
         
+        # Aliases (list a = t1) that nobody reads do not keep a temp alive
+        read_names = set()
         for instr in self.tac:
-            if instr[0] == "COPY":
-                dest, src = instr[1], instr[2]
-                copies[dest] = src
-            elif instr[0] == "LIST" and isinstance(instr[2], str):
-                # list x = y is also a copy
-                dest, src = instr[1], instr[2]
-                copies[dest] = src
-        
-        # Apply copy propagation
-        optimized = []
+            read_names.update(tac_reads(instr))
+        dead_alias = {
+            i for i, instr in enumerate(self.tac)
+            if instr[0] in ("LIST", "COPY") and isinstance(instr[2], str)
+            and instr[1] not in read_names
+        }
         
-        for instr in self.tac:
-            new_instr = list(instr)
-            opcode = instr[0]
+        readers = {}  # name -> indices of instructions reading it
+        writes = {}   # name -> indices of instructions writing it
+        for i, instr in enumerate(self.tac):
+            for name in tac_writes(instr):
+                writes.setdefault(name, []).append(i)
+            if i in dead_alias:
+                continue
+            for name in tac_reads(instr):
+                readers.setdefault(name, []).append(i)
+        
+        # statements[i]: instructions before i other than unread aliases
+        statements = [0]
+        for i in range(len(self.tac)):
+            statements.append(statements[-1] + (i not in dead_alias))
+        
+        fused = {}        # index of chain end -> FUSED instruction
+        consumed = set()  # chain steps replaced by a FUSED instruction
+        intermediates = set()
+        
+        for start, instr in enumerate(self.tac):
+            # A step already in a chain (including a chain end, whose
+            # result is now produced by the FUSED instruction) cannot
+            # start another one
+            if instr[0] not in ("FILTER", "MAP") or start in consumed or start in fused:
+                continue
+            
+            src = instr[2]
+            src_writes = writes.get(src, [])
+            chain = [start]
+            stages = [self._fusion_stage(instr)]
+            func = None
             
-            # Don't propagate into the destination
-            start_idx = 2 if opcode in ("LIST", "FILTER", "MAP", "STAT", "SETOP", "LISTOP", "COPY") else 1
+            while func is None:
+                name = self.tac[chain[-1]][1]
+                if not is_temp(name):
+                    break  # user lists are left as they are
+                users = readers.get(name, [])
+                if len(users) != 1:
+                    break
+                
+                # A MAP is not moved past statements that print or fail
+                if (any(stage[0] == "MAP" for stage in stages)
+                        and statements[users[0]] != statements[chain[-1] + 1]):
+                    break
+                
+                nxt = self.tac[users[0]]
+                if nxt[0] == "STAT":
+                    if nxt[2] not in STREAMING_STATS:
+                        break
+                elif nxt[0] not in ("FILTER", "MAP"):
+                    break
+                
+                # The fused instruction runs at the chain end: src must not
+                # be redefined (e.g. sorted) in between
+                k = bisect.bisect_right(src_writes, start)
+                if k < len(src_writes) and src_writes[k] < users[0]:
+                    break
+                
+                chain.append(users[0])
+                if nxt[0] == "STAT":
+                    func = nxt[2]
+                else:
+                    stages.append(self._fusion_stage(nxt))
             
-            # Replace uses with original source
-            for i in range(start_idx, len(new_instr)):
-                val = new_instr[i]
-                if isinstance(val, str) and val in copies:
-                    new_instr[i] = copies[val]
+            if len(chain) < 2:
+                continue
             
-            optimized.append(tuple(new_instr))
+            end = chain[-1]
+            fused[end] = ("FUSED", self.tac[end][1], src, tuple(stages), func)
+            consumed.update(chain[:-1])
+            intermediates.update(self.tac[i][1] for i in chain[:-1])
+        
+        if not fused:
+            return
+        
+        optimized = []
+        
+        for i, instr in enumerate(self.tac):
+            if i in fused:
+                optimized.append(fused[i])
+            elif i in consumed:
+                continue
+            elif i in dead_alias and instr[2] in intermediates:
+                continue  # alias of a list that is no longer materialized
+            else:
+                optimized.append(instr)
         
         self.tac = optimized
 
     # -----------------------------------------------------
-    # REMOVE REDUNDANT OPERATIONS
+    # MULTI-STATISTIC GROUPING
     # -----------------------------------------------------
-    def remove_redundant_operations(self):
-        """Remove redundant sorts, filters, and other operations"""
+    def group_statistics(self):
+        """
+        Group STAT instructions on the same unmodified list into one
+        ('STATS', dests, funcs, list_name) instruction, so the executor
+        computes all of them from a single pass over the list:
+            STAT t1 mean x ; PRINT t1 ; STAT t2 std x ; PRINT t2
+            → STATS (t1, t2) (mean, std) x ; PRINT t1 ; PRINT t2
+        A write to the list (e.g. SORT) closes its group.
+        
+        The group runs where its first STAT was, so a STAT that can fail
+        (any but count / sum, on an empty list) only joins it across
+        statements that print or fail when the group already holds such a
+        STAT: the error is then raised at the group in either case.
+        """
         optimized = []
-        last_sort = {}
+        open_groups = {}  # list name -> index of its STAT/STATS in optimized
+        sealed = set()    # open groups with a statement that prints or fails after them
         
         for instr in self.tac:
-            skip = False
-            
-            # Remove consecutive identical sorts
-            if instr[0] == "SORT":
-                # ('SORT', name, order)
-                name, order = instr[1], instr[2]
-                key = (name, order)
+            if instr[0] == "STAT":
+                # ('STAT', dest, func, list_name[, arg]); parameterized
+                # functions are grouped as (func, arg)
+                dest, func, src = instr[1], instr[2], instr[3]
+                if len(instr) > 4:
+                    func = (func, instr[4])
+                fails = instr[2] not in EMPTY_SAFE_STATS
+                idx = open_groups.get(src)
+                if (idx is not None and fails and src in sealed
+                        and not self._stats_can_fail(optimized[idx])):
+                    idx = None  # its error would move before those statements
                 
-                if key in last_sort:
-                    skip = True  # Redundant sort
+                if idx is None:
+                    open_groups[src] = len(optimized)
+                    sealed.discard(src)
+                    optimized.append(instr)
                 else:
-                    last_sort[key] = True
-            
-            # Remove identity copies (added by algebraic simplification)
-            elif instr[0] == "COPY":
-                dest, src = instr[1], instr[2]
-                if dest == src:
-                    skip = True
-            
-            # Remove list x = x
-            elif instr[0] == "LIST" and isinstance(instr[2], str):
-                name, src = instr[1], instr[2]
-                if name == src:
-                    skip = True
+                    group = optimized[idx]
+                    if group[0] == "STAT":
+                        first = group[2] if len(group) == 4 else (group[2], group[4])
+                        group = ("STATS", (group[1],), (first,), src)
+                    optimized[idx] = ("STATS", group[1] + (dest,), group[2] + (func,), src)
+                
+                if fails:
+                    sealed.update(name for name in open_groups if name != src)
+                continue
             
-            if not skip:
-                optimized.append(instr)
+            for name in tac_writes(instr):
+                open_groups.pop(name, None)
+                sealed.discard(name)
+            if instr[0] not in SILENT_OPCODES:
+                sealed.update(open_groups)
+            optimized.append(instr)
         
         self.tac = optimized
 
+    @staticmethod
+    def _stats_can_fail(group):
+        """Whether a STAT / STATS instruction computes a function that fails on empty lists"""
+        funcs = (group[2],) if group[0] == "STAT" else map(stat_func, group[2])
+        return any(func not in EMPTY_SAFE_STATS for func in funcs)
+
     # -----------------------------------------------------
-    # COMMON SUBEXPRESSION ELIMINATION (NEW)
+    # SHAPE / DTYPE INFERENCE
     # -----------------------------------------------------
-    def common_subexpression_elimination(self):
-        """Eliminate redundant computations"""
-        optimized = []
-        computed = {}  # (opcode, operands) -> result temp
+    def infer_types(self):
+        """
+        Static shape (length bounds, element dtype, order) of every name
+        of the optimized TAC, using the rules of the semantic analyzer.
+        A shape holds for every value the name takes (reassignments are
+        merged); None when unknown or not a list (STAT results).
+        Executors pick typed kernels from the dtypes.
+        """
+        types = {}
         
         for instr in self.tac:
             opcode = instr[0]
+            shape = None
             
-            # Check for duplicate computations
-            if opcode in ("FILTER", "MAP", "LISTOP", "SETOP"):
-                # Create key from operation
-                key = tuple(instr[1:])  # Everything except dest
-                
-                if key in computed:
-                    # Replace with copy from previous result
-                    dest = instr[1]
-                    prev_result = computed[key]
-                    optimized.append(("COPY", dest, prev_result))
-                else:
-                    # Record this computation
-                    dest = instr[1]
-                    computed[key] = dest
-                    optimized.append(instr)
-            else:
-                optimized.append(instr)
+            if opcode in ("LIST", "COPY"):
+                shape = self._operand_shape(types, instr[2])
+            
+            elif opcode in ("FILTER", "MAP", "SORT"):
+                src = types.get(instr[1] if opcode == "SORT" else instr[2])
+                if src is not None:
+                    if opcode == "FILTER":
+                        shape = filter_shape(src)
+                    elif opcode == "MAP":
+                        shape = map_shape(src, instr[3])
+                    else:
+                        shape = dict(src, order=instr[2])
+            
+            elif opcode in ("SETOP", "LISTOP"):
+                _, dest, op, left, right = instr
+                left = self._operand_shape(types, left)
+                right = self._operand_shape(types, right)
+                if left is not None and right is not None:
+                    shape_of = setop_shape if opcode == "SETOP" else listop_shape
+                    try:
+                        shape = shape_of(op, left, right)
+                    except Exception:
+                        # Lengths of folded lists are exact: a mismatch the
+                        # analyzer could not see is reported by the executor
+                        shape = None
+            
+            elif opcode == "FUSED":
+                _, dest, src, stages, func = instr
+                shape = types.get(src) if func is None else None
+                for stage in stages:
+                    if shape is None:
+                        break
+                    if stage[0] == "FILTER":
+                        shape = filter_shape(shape)
+                    else:
+                        shape = map_shape(shape, stage[1])
+            
+            for dest in tac_writes(instr):
+                if dest in types:
+                    shape = self._merge_shapes(types[dest], shape)
+                types[dest] = shape
         
-        self.tac = optimized
+        return types
+
+    @staticmethod
+    def _operand_shape(types, value):
+        """Shape of a TAC operand: name, literal list or scalar"""
+        if isinstance(value, str):
+            return types.get(value)
+        if isinstance(value, list):
+            return literal_shape(value)
+        return scalar_shape(value)
+
+    @staticmethod
+    def _merge_shapes(a, b):
+        """Shape covering the values of both a and b"""
+        if a is None or b is None:
+            return None
+        return {
+            "length": (min(a["length"][0], b["length"][0]), max(a["length"][1], b["length"][1])),
+            "dtype": a["dtype"] if a["dtype"] == b["dtype"] else None,
+            "order": a["order"] if a["order"] == b["order"] else None,
+        }
+
+    @staticmethod
+    def _fusion_stage(instr):
+        """Pipeline stage of a FILTER or MAP instruction"""
+        if instr[0] == "FILTER":
+            # ('FILTER', dest, src, op, value)
+            return ("FILTER", instr[3], instr[4])
+        # ('MAP', dest, src, expr_code)
+        return ("MAP", instr[3])
 
     # -----------------------------------------------------
     # UTILITY: Pretty print
@@ -4,65 +4,103 @@ from typing import List, Any
 # AST Nodes
 # ================================
 
-class ListDecl:
+class Node:
+    """
+    Base of the AST nodes. Attributes are __slots__ (no per-instance
+    __dict__), which keeps large machine-generated programs compact.
+    """
+    __slots__ = ()
+
+    def fields(self):
+        """Attribute name -> value"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class ListDecl(Node):
+    __slots__ = ('name', 'source')
+
     def __init__(self, name: str, source):
         self.name = name
         self.source = source
 
-class FilterStmt:
-    def __init__(self, list_name: str, op: str, value: float):
+class FilterStmt(Node):
+    # (op, value) is the predicate (see predicates.py): a comparison
+    # ('>', 3.0), or 'and' / 'or' with a tuple of predicates as value
+    __slots__ = ('list_name', 'op', 'value')
+
+    def __init__(self, list_name: str, op: str, value):
         self.list_name = list_name
         self.op = op
         self.value = value
 
-class SortStmt:
+class SortStmt(Node):
+    __slots__ = ('list_name', 'order')
+
     def __init__(self, list_name: str, order: str):
         self.list_name = list_name
         self.order = order
 
-class MapStmt:
+class MapStmt(Node):
+    __slots__ = ('list_name', 'expr')
+
     def __init__(self, list_name: str, expr):
         self.list_name = list_name
         self.expr = expr
 
-class SetOpStmt:
+class SetOpStmt(Node):
+    __slots__ = ('left', 'op', 'right')
+
     def __init__(self, left, op: str, right):
         self.left = left
         self.op = op
         self.right = right
 
-class ListOpStmt:
+class ListOpStmt(Node):
+    __slots__ = ('left', 'op', 'right')
+
     def __init__(self, left, op: str, right):
         self.left = left
         self.op = op
         self.right = right
 
-class StatStmt:
-    def __init__(self, func: str, list_name: str):
+class StatStmt(Node):
+    __slots__ = ('func', 'list_name', 'arg')
+
+    def __init__(self, func: str, list_name: str, arg: float = None):
         self.func = func
         self.list_name = list_name
+        self.arg = arg  # percentile / quantile position, None otherwise
+
+class PrintStmt(Node):
+    __slots__ = ('target',)
 
-class PrintStmt:
     def __init__(self, target):
         self.target = target
 
 # Expression nodes
-class BinOp:
+class BinOp(Node):
+    __slots__ = ('left', 'op', 'right')
+
     def __init__(self, left, op: str, right):
         self.left = left
         self.op = op
         self.right = right
 
-class UnaryOp:
+class UnaryOp(Node):
+    __slots__ = ('op', 'expr')
+
     def __init__(self, op: str, expr):
         self.op = op
         self.expr = expr
 
-class Number:
+class Number(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value: float):
         self.value = value
 
-class Var:
+class Var(Node):
+    __slots__ = ('name',)
+
     def __init__(self, name: str):
         self.name = name
 
@@ -73,12 +111,18 @@ class Var:
 
 class Parser:
     def __init__(self, tokens):
-        self.tokens = tokens
+        self.tokens = tokens  # list of Tokens or a lexer.TokenStream
         self.pos = 0
+        self.tok = None  # Token at pos, read once per position
 
     def current(self):
-        if self.pos < len(self.tokens):
-            return self.tokens[self.pos]
+        if self.tok is not None:
+            return self.tok
+        try:
+            self.tok = self.tokens[self.pos]
+            return self.tok
+        except IndexError:
+            pass
         # Return EOF token
         from collections import namedtuple
         Token = namedtuple('Token', ['type', 'value', 'line', 'col'])
@@ -86,12 +130,20 @@ class Parser:
 
     def advance(self):
         self.pos += 1
+        self.tok = None
+
+    def describe(self, tok):
+        """Token as shown in error messages"""
+        if tok.type == 'NUMARRAY':
+            # Bulk literal array: reported by its opening bracket
+            return "LBRACK '['"
+        return f"{tok.type} '{tok.value}'"
 
     def expect(self, kind, value=None):
         tok = self.current()
         if tok.type != kind or (value is not None and tok.value != value):
             raise SyntaxError(
-                f"Expected {kind} {value or ''}, got {tok.type} '{tok.value}' "
+                f"Expected {kind} {value or ''}, got {self.describe(tok)} "
                 f"at line {tok.line}, col {tok.col}"
             )
         self.advance()
@@ -138,7 +190,7 @@ class Parser:
                 f"at line {tok.line}. Did you mean to assign it to a list?"
             )
 
-        raise SyntaxError(f"Invalid statement start: {tok.type} '{tok.value}' at line {tok.line}")
+        raise SyntaxError(f"Invalid statement start: {self.describe(tok)} at line {tok.line}")
 
     # -----------------------------
     # List declaration / sources
@@ -227,7 +279,12 @@ class Parser:
             self.expect('RPAREN')
             return node
 
-        # Literal array
+        # Literal array, lexed as one NUMARRAY token
+        if tok.type == 'NUMARRAY':
+            self.advance()
+            return tok.value.tolist()
+
+        # Literal array (with comments inside, or malformed)
         if tok.type == 'LBRACK':
             self.advance()
             nums = []
@@ -260,7 +317,7 @@ class Parser:
             return name
 
         raise SyntaxError(
-            f"Invalid list primary: {tok.type} '{tok.value}' at line {tok.line}"
+            f"Invalid list primary: {self.describe(tok)} at line {tok.line}"
         )
 
     # -----------------------------
@@ -269,10 +326,51 @@ class Parser:
     def filter_stmt(self):
         self.expect('KEYWORD', 'filter')
         name = self.expect('ID').value
-        op = self.expect('COMP').value
-        val = float(self.expect('NUMBER').value)
+        op, val = self.predicate()
         return FilterStmt(name, op, val)
 
+    # -----------------------------
+    # Filter predicates
+    # -----------------------------
+    def predicate(self):
+        """Predicate: conditions joined by 'and' / 'or' ('and' binds tighter)"""
+        parts = [self.conjunction()]
+        while self.current().type == 'KEYWORD' and self.current().value == 'or':
+            self.advance()
+            parts.append(self.conjunction())
+        return self.compound('or', parts)
+
+    def conjunction(self):
+        parts = [self.condition()]
+        while self.current().type == 'KEYWORD' and self.current().value == 'and':
+            self.advance()
+            parts.append(self.condition())
+        return self.compound('and', parts)
+
+    def condition(self):
+        # between 3 and 10  →  >= 3 and <= 10
+        if self.accept('KEYWORD', 'between'):
+            low = float(self.expect('NUMBER').value)
+            self.expect('KEYWORD', 'and')
+            high = float(self.expect('NUMBER').value)
+            return ('and', (('>=', low), ('<=', high)))
+        if self.accept('LPAREN'):
+            predicate = self.predicate()
+            self.expect('RPAREN')
+            return predicate
+        op = self.expect('COMP').value
+        return (op, float(self.expect('NUMBER').value))
+
+    @staticmethod
+    def compound(op, parts):
+        """op of parts, nested predicates of the same op flattened into it"""
+        if len(parts) == 1:
+            return parts[0]
+        flat = []
+        for part in parts:
+            flat.extend(part[1] if part[0] == op else [part])
+        return (op, tuple(flat))
+
     def sort_stmt(self):
         self.expect('KEYWORD', 'sort')
         name = self.expect('ID').value
@@ -306,13 +404,21 @@ class Parser:
             name = self.expect('ID').value
             return StatStmt(func, name)
         
+        # Parameterized statistics: percentile x 90 / quantile x 0.9
+        if tok.type == 'KEYWORD' and tok.value in ('percentile', 'quantile'):
+            func = tok.value
+            self.advance()
+            name = self.expect('ID').value
+            arg = float(self.expect('NUMBER').value)
+            return StatStmt(func, name, arg)
+        
         # Otherwise must be a list identifier
         if tok.type == 'ID':
             return self.expect('ID').value
         
         raise SyntaxError(
             f"Print target must be list identifier or statistical operation, "
-            f"got {tok.type} '{tok.value}' at line {tok.line}"
+            f"got {self.describe(tok)} at line {tok.line}"
         )
 
     # -----------------------------
@@ -384,5 +490,5 @@ class Parser:
             return node
 
         raise SyntaxError(
-            f"Invalid expression primary: {tok.type} '{tok.value}' at line {tok.line}"
+            f"Invalid expression primary: {self.describe(tok)} at line {tok.line}"
         )
\ No newline at end of file
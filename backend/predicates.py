@@ -0,0 +1,191 @@
+import math
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # only the array backend evaluates vectorized predicates
+    np = None
+
+# ================================
+# FILTER predicates
+# ================================
+#
+# A FILTER keeps the elements x for which its predicate (op, value) holds:
+#
+#     ('>', 3.0)                 x > 3.0 (op: any of COMPARISONS)
+#     ('and', (p, q, ...))       every predicate p, q, ... holds
+#     ('or', (p, q, ...))        any of them holds
+#     ('nonfinite', None)        x is inf or nan
+#
+# ('FILTER', dest, src, op, value) holds its predicate in op and value, so
+# a plain comparison is the predicate of one comparison:
+#
+#     ('FILTER', 't2', 'x', 'and', (('>', 3.0), ('<', 10.0)))
+
+COMPARISONS = ('==', '!=', '>', '>=', '<', '<=')
+
+# Comparison with the operands swapped (y > v  <=>  -y < -v)
+FLIPPED = {'>': '<', '>=': '<=', '<': '>', '<=': '>=', '==': '==', '!=': '!='}
+
+# Largest threshold put into a predicate: float64 and int64 arrays compare
+# with it exactly
+MAX_THRESHOLD = 2 ** 53
+
+PREDICATE_CACHE_SIZE = 1024
+
+
+def predicate_code(op, value, vectorized=False):
+    """
+    Python code of a predicate of x. vectorized: NumPy mask code, where x
+    is an array (& | ~ instead of and / or / not).
+        ('and', (('>', 3.0), ('<', 10.0)))  →  (x > 3.0 and x < 10.0)
+                                   vectorized  ((x > 3.0) & (x < 10.0))
+    """
+    if op in COMPARISONS:
+        return f"(x {op} {value!r})" if vectorized else f"x {op} {value!r}"
+    if op in ('and', 'or'):
+        joiner = {'and': ' & ', 'or': ' | '}[op] if vectorized else f" {op} "
+        return "(" + joiner.join(predicate_code(p, v, vectorized) for p, v in value) + ")"
+    if op == 'nonfinite':
+        return "~isfinite(x)" if vectorized else "not isfinite(x)"
+    raise Exception(f"Invalid comparison operator: {op}")
+
+
+@lru_cache(maxsize=PREDICATE_CACHE_SIZE)
+def compile_predicate(op, value, vectorized=False):
+    """Function of x (an element, or an array when vectorized) testing a predicate"""
+    code = predicate_code(op, value, vectorized)
+    isfinite = np.isfinite if vectorized else math.isfinite
+    return eval(compile(f"lambda x: {code}", "<filter>", "eval"),
+                {'__builtins__': {}, 'isfinite': isfinite, 'inf': math.inf, 'nan': math.nan})
+
+
+def predicate_bounds(op, value):
+    """The comparisons of a range (an 'and' of comparisons), else None"""
+    if op == 'and' and all(p in COMPARISONS for p, _ in value):
+        return value
+    return None
+
+
+# ---------- Merging ----------
+
+def merge_predicates(first, second):
+    """
+    Predicate of filtering with first, then with second: an 'and' of
+    both, keeping only the tightest lower and upper bound.
+        x > 3 ; x < 10 ; x > 5  →  ('and', (('>', 5), ('<', 10)))
+    """
+    parts = []
+    for op, value in (first, second):
+        parts.extend(value if op == 'and' else [(op, value)])
+
+    lower = upper = None
+    others = []
+    for op, value in parts:
+        if op in ('>', '>='):
+            if lower is None or value > lower[1] or (value == lower[1] and op == '>'):
+                lower = (op, value)
+        elif op in ('<', '<='):
+            if upper is None or value < upper[1] or (value == upper[1] and op == '<'):
+                upper = (op, value)
+        else:
+            others.append((op, value))
+
+    parts = [p for p in (lower, upper) if p is not None] + others
+    if len(parts) == 1:
+        return parts[0]
+    return ('and', tuple(parts))
+
+
+# ---------- Pushdown through a MAP ----------
+
+def predicate_through_map(predicate, scale, offset, int_source):
+    """
+    Predicate of x equivalent to predicate on scale * int(x) + offset (an
+    affine MAP, see map_affine), or None. The threshold of each comparison
+    is inverted with integer arithmetic:
+        scale * int(x) + offset > 9  with scale 2, offset 1  →  int(x) > 4
+    int_source: x are ints; otherwise int(x) truncation is applied to the
+    bounds, and elements that are not finite are kept, so the MAP still
+    reports their error.
+    """
+    op, value = predicate
+    result = _through_affine(op, value, scale, offset, int_source)
+    if result is not None and not int_source:
+        result = _combine('or', [result, ('nonfinite', None)])
+    if result is None or isinstance(result, bool):
+        return None  # keeps all or no elements: left as is
+    return result
+
+
+def _through_affine(op, value, scale, offset, int_source):
+    """Predicate on x, True / False when constant, None when not invertible"""
+    if op in ('and', 'or'):
+        return _combine(op, [_through_affine(p, v, scale, offset, int_source) for p, v in value])
+    if op == 'nonfinite':
+        return False  # the MAP result is an int
+    if op not in COMPARISONS or type(value) not in (int, float) or not math.isfinite(value):
+        return None
+
+    # y op value  <=>  y op k  for an int y
+    if type(value) is float and not value.is_integer():
+        if op in ('==', '!='):
+            return op == '!='
+        value = math.floor(value) if op in ('>', '<=') else math.ceil(value)
+
+    # scale * t + offset op k  <=>  t op' bound  for t = int(x)
+    m = int(value) - offset
+    if scale < 0:
+        scale, m, op = -scale, -m, FLIPPED[op]
+    if op in ('>', '<='):
+        bound = m // scale
+    elif op in ('>=', '<'):
+        bound = -(-m // scale)
+    elif m % scale:
+        return op == '!='
+    else:
+        bound = m // scale
+
+    if int_source:
+        return _threshold(op, bound, int)
+    return _truncated(op, bound)
+
+
+def _truncated(op, k):
+    """Predicate on a finite x for int(x) op k (int() truncates toward zero)"""
+    if op == '==':
+        return _combine('and', [_truncated('>=', k), _truncated('<=', k)])
+    if op == '!=':
+        return _combine('or', [_truncated('<', k), _truncated('>', k)])
+    if op == '>':
+        op, k = '>=', k + 1
+    elif op == '<':
+        op, k = '<=', k - 1
+    if op == '>=':
+        return _threshold('>=', k, float) if k >= 1 else _threshold('>', k - 1, float)
+    return _threshold('<', k + 1, float) if k >= 0 else _threshold('<=', k, float)
+
+
+def _threshold(op, k, kind):
+    if abs(k) > MAX_THRESHOLD:
+        return None
+    return (op, kind(k))
+
+
+def _combine(op, parts):
+    """'and' / 'or' of parts, with constant parts folded"""
+    neutral = op == 'and'  # True for 'and', False for 'or'
+    kept = []
+    for part in parts:
+        if part is None:
+            return None
+        if part is neutral:
+            continue
+        if isinstance(part, bool):
+            return part  # False in an 'and', True in an 'or'
+        kept.extend(part[1] if part[0] == op else [part])
+    if not kept:
+        return neutral
+    if len(kept) == 1:
+        return kept[0]
+    return (op, tuple(kept))
@@ -2,10 +2,102 @@ from parser import (
     ListDecl, FilterStmt, SortStmt, MapStmt, StatStmt, PrintStmt, 
     SetOpStmt, ListOpStmt, BinOp, UnaryOp, Number, Var
 )
+from map_expressions import expr_to_code, map_dtype, map_order, sorted_order
+
+# ==========================================================
+# SHAPE / DTYPE INFERENCE
+# ==========================================================
+#
+# Static properties of a list (kept in its symbol table entry, and in
+# Optimizer.types for every TAC name):
+#   length: (lo, hi) bounds on its number of elements (lo == hi: exact)
+#   dtype:  element type "int" / "float", None when unknown or mixed
+#   order:  "asc" / "desc" when it is known to be sorted
+
+def values_dtype(values):
+    """dtype of a literal list"""
+    types = {type(v) for v in values}
+    if types == {int}:
+        return "int"
+    if types == {float}:
+        return "float"
+    return None
+
+
+def literal_shape(values):
+    n = len(values)
+    return {"length": (n, n), "dtype": values_dtype(values), "order": sorted_order(values)}
+
+
+def scalar_shape(value):
+    """list x = 5 / a scalar operand: a one-element list"""
+    return {"length": (1, 1), "dtype": values_dtype([value]), "order": "asc"}
+
+
+def filter_shape(src):
+    return {"length": (0, src["length"][1]), "dtype": src["dtype"], "order": src["order"]}
+
+
+def map_shape(src, expr_code):
+    return {
+        "length": src["length"],
+        "dtype": map_dtype(expr_code),
+        "order": map_order(expr_code, src["order"]),
+    }
+
+
+def listop_shape(op, left, right):
+    """Shape of an element-wise operation; raises when the lengths can never match"""
+    (llo, lhi), (rlo, rhi) = left["length"], right["length"]
+    
+    # Same rules as element_wise_op: equal lengths, or one side of length 1
+    # broadcast to the other
+    cases = []
+    if max(llo, rlo) <= min(lhi, rhi):
+        cases.append((max(llo, rlo), min(lhi, rhi)))
+    if llo <= 1 <= lhi and rhi > 1:
+        cases.append((max(rlo, 2), rhi))
+    if rlo <= 1 <= rhi and lhi > 1:
+        cases.append((max(llo, 2), lhi))
+    if not cases:
+        raise Exception(
+            f"Semantic Error: List length mismatch: {format_length(left)} vs {format_length(right)}"
+        )
+    
+    if op == '/':
+        dtype = "float"
+    elif op in ('and', 'or', 'xor'):
+        dtype = "int"  # operands are truncated with int()
+    elif left["dtype"] is None or right["dtype"] is None:
+        dtype = None
+    else:
+        dtype = "int" if left["dtype"] == right["dtype"] == "int" else "float"
+    
+    length = (min(lo for lo, _ in cases), max(hi for _, hi in cases))
+    return {"length": length, "dtype": dtype, "order": None}
+
+
+def setop_shape(op, left, right):
+    (llo, lhi), (rlo, rhi) = left["length"], right["length"]
+    if op == "union":
+        length = (1 if llo or rlo else 0, lhi + rhi)  # duplicates are removed
+    elif op == "intersection":
+        length = (0, min(lhi, rhi))
+    else:
+        length = (0, lhi)
+    dtype = left["dtype"] if left["dtype"] == right["dtype"] else None
+    return {"length": length, "dtype": dtype, "order": None}
+
+
+def format_length(shape):
+    lo, hi = shape["length"]
+    return str(lo) if lo == hi else f"{lo}..{hi}"
+
 
 class SemanticAnalyzer:
     def __init__(self):
-        # symbol table: name -> { "type": "list", "declared": True }
+        # symbol table: name -> { "type": "list", "declared": True,
+        #                         "length": (lo, hi), "dtype": ..., "order": ... }
         self.symbols = {}
 
     def analyze(self, ast):
@@ -72,50 +164,60 @@ class SemanticAnalyzer:
             raise Exception(f"Semantic Error: Redeclaration of '{node.name}'")
         
         # Validate the source
-        self.validate_list_source(node.source)
+        shape = self.validate_list_source(node.source)
         
         # Add to symbol table
-        self.symbols[node.name] = {"type": "list", "declared": True}
+        self.symbols[node.name] = {"type": "list", "declared": True, **shape}
 
     def validate_list_source(self, source):
-        """Validate a list source (array, identifier, or statement)"""
+        """Validate a list source (array, identifier, or statement); returns its shape"""
         
         # Literal array [1, 2, 3]
         if isinstance(source, list):
             for v in source:
                 if not isinstance(v, (int, float)):
                     raise Exception(f"Semantic Error: List contains non-numeric value {v}")
-            return
+            return literal_shape(source)
         
         # Identifier reference
         if isinstance(source, str):
             self.assert_declared(source)
             self.assert_list(source)
-            return
+            return self.shape_of(source)
         
         # Scalar number (for operations like: list x = 5)
         if isinstance(source, (int, float)):
-            return
+            return scalar_shape(source)
         
         # Statement (filter, map, set op, list op)
         if isinstance(source, (FilterStmt, MapStmt, SetOpStmt, ListOpStmt)):
-            self.visit(source)
-            return
+            return self.visit(source)
         
         raise Exception(f"Semantic Error: Invalid list source type {type(source).__name__}")
 
     def visit_filter(self, node):
-        """Validate filter statement: filter list_name > value"""
+        """Validate filter statement: filter list_name > value [and < value ...]"""
         self.assert_declared(node.list_name)
         self.assert_list(node.list_name)
-        
+        self.check_predicate(node.op, node.value)
+        return filter_shape(self.shape_of(node.list_name))
+
+    def check_predicate(self, op, value):
+        """Validate a filter predicate: a comparison, or 'and' / 'or' of predicates"""
+        if op in ("and", "or"):
+            if not isinstance(value, tuple) or len(value) < 2:
+                raise Exception(f"Semantic Error: '{op}' in a filter needs at least two conditions")
+            for part_op, part_value in value:
+                self.check_predicate(part_op, part_value)
+            return
+
         # Validate comparison operator
-        if node.op not in ("==", "!=", ">", ">=", "<", "<="):
-            raise Exception(f"Semantic Error: Invalid comparison operator '{node.op}'")
+        if op not in ("==", "!=", ">", ">=", "<", "<="):
+            raise Exception(f"Semantic Error: Invalid comparison operator '{op}'")
         
         # Validate value is numeric
-        if not isinstance(node.value, (int, float)):
-            raise Exception(f"Semantic Error: Filter value must be numeric, got {type(node.value).__name__}")
+        if not isinstance(value, (int, float)):
+            raise Exception(f"Semantic Error: Filter value must be numeric, got {type(value).__name__}")
 
     def visit_sort(self, node):
         """Validate sort statement: sort list_name asc/desc"""
@@ -124,6 +226,8 @@ class SemanticAnalyzer:
         
         if node.order not in ("asc", "desc"):
             raise Exception(f"Semantic Error: Sort order must be 'asc' or 'desc', got '{node.order}'")
+        
+        self.symbols[node.list_name]["order"] = node.order
 
     def visit_map(self, node):
         """Validate map statement: map list_name $0 => expr"""
@@ -132,15 +236,25 @@ class SemanticAnalyzer:
         
         # Validate the expression uses only $0 and numbers
         self.validate_map_expr(node.expr)
+        
+        # Inferred from the expression as the TAC will hold it
+        return map_shape(self.shape_of(node.list_name), expr_to_code(node.expr))
 
     def visit_stat(self, node):
         """Validate statistical operation: mean list_name"""
         self.assert_declared(node.list_name)
         self.assert_list(node.list_name)
         
-        valid_funcs = ('mean', 'sum', 'median', 'variance', 'std', 'min', 'max', 'count')
+        valid_funcs = ('mean', 'sum', 'median', 'variance', 'std', 'min', 'max', 'count',
+                       'percentile', 'quantile')
         if node.func not in valid_funcs:
             raise Exception(f"Semantic Error: Invalid statistical function '{node.func}'")
+        
+        # Position argument of percentile (0-100) / quantile (0-1)
+        if node.func == 'percentile' and not 0 <= node.arg <= 100:
+            raise Exception(f"Semantic Error: Percentile must be between 0 and 100, got {node.arg}")
+        if node.func == 'quantile' and not 0 <= node.arg <= 1:
+            raise Exception(f"Semantic Error: Quantile must be between 0 and 1, got {node.arg}")
 
     def visit_print(self, node):
         """Validate print statement: print target"""
@@ -165,84 +279,107 @@ class SemanticAnalyzer:
         if isinstance(node.left, str):
             self.assert_declared(node.left)
             self.assert_list(node.left)
+            left = self.shape_of(node.left)
         else:
-            self.validate_list_source(node.left)
+            left = self.validate_list_source(node.left)
         
         # Validate right operand
         if isinstance(node.right, str):
             self.assert_declared(node.right)
             self.assert_list(node.right)
+            right = self.shape_of(node.right)
         else:
-            self.validate_list_source(node.right)
+            right = self.validate_list_source(node.right)
         
         # Validate operator
         if node.op not in ("union", "intersection", "difference"):
             raise Exception(f"Semantic Error: Invalid set operation '{node.op}'")
+        
+        return setop_shape(node.op, left, right)
 
     def visit_list_op(self, node):
-        """Validate list operation: a + b * 2"""
-        
-        # Validate left operand
-        if isinstance(node.left, str):
-            self.assert_declared(node.left)
-            self.assert_list(node.left)
-        elif isinstance(node.left, (int, float)):
-            pass  # Scalar is ok
-        elif isinstance(node.left, list):
-            pass  # Literal array is ok
-        elif isinstance(node.left, ListOpStmt):
-            self.visit_list_op(node.left)  # Recursive
-        else:
-            raise Exception(f"Semantic Error: Invalid list operation operand type {type(node.left).__name__}")
-        
-        # Validate right operand
-        if isinstance(node.right, str):
-            self.assert_declared(node.right)
-            self.assert_list(node.right)
-        elif isinstance(node.right, (int, float)):
-            pass  # Scalar is ok
-        elif isinstance(node.right, list):
-            pass  # Literal array is ok
-        elif isinstance(node.right, ListOpStmt):
-            self.visit_list_op(node.right)  # Recursive
-        else:
-            raise Exception(f"Semantic Error: Invalid list operation operand type {type(node.right).__name__}")
-        
-        # Validate operator
-        if node.op not in ('+', '-', '*', '/', '%', 'and', 'or', 'xor'):
-            raise Exception(f"Semantic Error: Invalid list operation '{node.op}'")
+        """
+        Validate list operation: a + b * 2
+        
+        Nested operations are walked with an explicit stack (not recursion):
+        machine-generated chains like a + b + c + ... can be thousands deep.
+        """
+        stack = [(node, [])]  # (operation, shapes of its validated operands)
+        while True:
+            node, shapes = stack[-1]
+            
+            # Validate left operand, then right operand
+            if len(shapes) < 2:
+                operand = node.right if shapes else node.left
+                if isinstance(operand, ListOpStmt):
+                    stack.append((operand, []))
+                else:
+                    shapes.append(self.list_op_operand(operand))
+                continue
+            
+            # Validate operator
+            if node.op not in ('+', '-', '*', '/', '%', 'and', 'or', 'xor'):
+                raise Exception(f"Semantic Error: Invalid list operation '{node.op}'")
+            
+            # Lengths that can never match are rejected before anything runs
+            shape = listop_shape(node.op, *shapes)
+            stack.pop()
+            if not stack:
+                return shape
+            stack[-1][1].append(shape)
+
+    def list_op_operand(self, operand):
+        """Validate a list operation operand that is not itself an operation; returns its shape"""
+        if isinstance(operand, str):
+            self.assert_declared(operand)
+            self.assert_list(operand)
+            return self.shape_of(operand)
+        if isinstance(operand, (int, float)):
+            return scalar_shape(operand)  # Scalar is ok
+        if isinstance(operand, list):
+            return literal_shape(operand)  # Literal array is ok
+        raise Exception(f"Semantic Error: Invalid list operation operand type {type(operand).__name__}")
 
     # --------------------------------------------
     # Expression Validation (for map statements)
     # --------------------------------------------
     def validate_map_expr(self, expr):
-        """Validate expression in map statement - only $0 and numbers allowed"""
-        
-        if isinstance(expr, Number):
-            return  # Numbers are always valid
-        
-        if isinstance(expr, Var):
-            if expr.name != "$0":
-                raise Exception(f"Semantic Error: Invalid variable '{expr.name}' in map expression. Only $0 is allowed.")
-            return
-        
-        if isinstance(expr, UnaryOp):
-            if expr.op != '-':
-                raise Exception(f"Semantic Error: Invalid unary operator '{expr.op}' in map expression")
-            self.validate_map_expr(expr.expr)
-            return
-        
-        if isinstance(expr, BinOp):
-            # Validate operator
-            if expr.op not in ('+', '-', '*', '/', '%', 'and', 'or', 'xor'):
-                raise Exception(f"Semantic Error: Invalid operator '{expr.op}' in map expression")
+        """
+        Validate expression in map statement - only $0 and numbers allowed
+        
+        Walked with an explicit stack (not recursion), in the same order as
+        a recursive walk: machine-generated expressions like $0 + $0 + ...
+        can be thousands deep.
+        """
+        stack = [expr]
+        while stack:
+            expr = stack.pop()
             
-            # Recursively validate operands
-            self.validate_map_expr(expr.left)
-            self.validate_map_expr(expr.right)
-            return
-        
-        raise Exception(f"Semantic Error: Invalid expression type {type(expr).__name__} in map")
+            if isinstance(expr, Number):
+                continue  # Numbers are always valid
+            
+            if isinstance(expr, Var):
+                if expr.name != "$0":
+                    raise Exception(f"Semantic Error: Invalid variable '{expr.name}' in map expression. Only $0 is allowed.")
+                continue
+            
+            if isinstance(expr, UnaryOp):
+                if expr.op != '-':
+                    raise Exception(f"Semantic Error: Invalid unary operator '{expr.op}' in map expression")
+                stack.append(expr.expr)
+                continue
+            
+            if isinstance(expr, BinOp):
+                # Validate operator
+                if expr.op not in ('+', '-', '*', '/', '%', 'and', 'or', 'xor'):
+                    raise Exception(f"Semantic Error: Invalid operator '{expr.op}' in map expression")
+                
+                # Validate operands, left first
+                stack.append(expr.right)
+                stack.append(expr.left)
+                continue
+            
+            raise Exception(f"Semantic Error: Invalid expression type {type(expr).__name__} in map")
 
     def validate_expr(self, expr):
         """General expression validation (for non-map contexts)"""
@@ -257,6 +394,11 @@ class SemanticAnalyzer:
         if name not in self.symbols:
             raise Exception(f"Semantic Error: Variable '{name}' not declared")
 
+    def shape_of(self, name):
+        """Inferred shape (length, dtype, order) of a declared list"""
+        entry = self.symbols[name]
+        return {"length": entry["length"], "dtype": entry["dtype"], "order": entry["order"]}
+
     def assert_list(self, name):
         """Check if a variable is a list type"""
         if name not in self.symbols:
@@ -0,0 +1,261 @@
+from intermediate_code_generator import is_temp
+
+# ================================
+# SSA form of the TAC
+# ================================
+#
+# Every value gets its own integer virtual register, defined exactly once:
+#
+#     LIST a [3, 1]          r0 = LIST [3, 1]          (a)
+#     SORT a asc        →    r1 = SORT r0 asc          (a)
+#     PRINT a                PRINT r1
+#
+# SORT defines a new version of its list instead of changing it, so a
+# register always holds the same value. Each register knows the TAC name it
+# is stored under, its definition and its uses (def-use chains), and
+# to_tac() turns the program back into TAC for the executors.
+
+# opcode -> (position of the dest, positions of the operands) in the TAC
+# tuple; the remaining fields are attributes (operators, expressions, ...)
+LAYOUT = {
+    "LIST":   (1, (2,)),     # ('LIST', name, source)
+    "COPY":   (1, (2,)),     # ('COPY', dest, src)
+    "CONST":  (1, (2,)),     # ('CONST', dest, value): scalar constant
+    "FILTER": (1, (2,)),     # ('FILTER', dest, src, op, value)
+    "MAP":    (1, (2,)),     # ('MAP', dest, src, expr)
+    "SORT":   (1, (1,)),     # ('SORT', name, order): new version of name
+    "STAT":   (1, (3,)),     # ('STAT', dest, func, list_name[, arg])
+    "SETOP":  (1, (3, 4)),   # ('SETOP', dest, op, left, right)
+    "LISTOP": (1, (3, 4)),   # ('LISTOP', dest, op, left, right)
+    "FUSED":  (1, (2,)),     # ('FUSED', dest, src, stages, func)
+    "PRINT":  (None, (1,)),  # ('PRINT', target)
+}
+
+
+class Const:
+    """Literal operand: a list literal or a scalar"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return f"Const({self.value!r})"
+
+
+class Instr:
+    """
+    One SSA instruction. dest is a register (None for PRINT), operands are
+    registers (ints) or Consts; fields is the TAC tuple it came from, which
+    also holds its attributes (operators, expressions, ...).
+    """
+    __slots__ = ('opcode', 'dest', 'operands', 'fields', 'index', 'removed', 'changed')
+
+    def __init__(self, opcode, dest, operands, fields, index):
+        self.opcode = opcode
+        self.dest = dest
+        self.operands = operands
+        self.fields = fields
+        self.index = index      # position in the source TAC
+        self.removed = False
+        self.changed = False    # operands differ from fields
+
+    @property
+    def attrs(self):
+        dest_pos, operand_pos = LAYOUT[self.opcode]
+        return tuple(
+            value for pos, value in enumerate(self.fields)
+            if pos and pos != dest_pos and pos not in operand_pos
+        )
+
+    def __repr__(self):
+        dest = f"r{self.dest} = " if self.dest is not None else ""
+        operands = ", ".join(f"r{op}" if type(op) is int else repr(op) for op in self.operands)
+        return f"{dest}{self.opcode} {operands} {self.attrs}"
+
+
+class SSAProgram:
+    """
+    SSA form of a TAC program. Registers are indexes into the per-register
+    tables:
+
+        names[r]   TAC name the value is stored under
+        defs[r]    defining Instr (None: read before any assignment)
+        uses[r]    Instrs reading r, once per operand
+        killed[r]  index of the instruction that assigns names[r] again
+                   (it still reads r)
+    """
+
+    def __init__(self, tac):
+        self.instrs = instrs = []
+        self.names = names = []
+        self.defs = defs = []
+        self.uses = uses = []
+        self.killed = killed = []
+
+        current = {}  # TAC name -> register holding its value
+        end = len(tac)
+
+        for index, fields in enumerate(tac):
+            opcode = fields[0]
+            layout = LAYOUT.get(opcode)
+            if layout is None:
+                raise Exception(f"SSA: unsupported opcode {opcode}")
+            dest_pos, operand_pos = layout
+
+            instr = Instr(opcode, None, [], fields, index)
+            operands = instr.operands
+            for pos in operand_pos:
+                value = fields[pos]
+                if value.__class__ is str:
+                    reg = current.get(value)
+                    if reg is None:
+                        # Read before assignment: the executor reports it
+                        reg = current[value] = len(names)
+                        names.append(value)
+                        defs.append(None)
+                        uses.append([])
+                        killed.append(end)
+                    uses[reg].append(instr)
+                    operands.append(reg)
+                else:
+                    operands.append(Const(value))
+
+            if dest_pos is not None:
+                name = fields[dest_pos]
+                previous = current.get(name)
+                if previous is not None:
+                    killed[previous] = index
+                instr.dest = current[name] = len(names)
+                names.append(name)
+                defs.append(instr)
+                uses.append([])
+                killed.append(end)
+
+            instrs.append(instr)
+
+    def kind(self, reg):
+        """'list' or 'scalar' (STAT results, CONSTs) - the type of a register"""
+        instr = self.defs[reg]
+        while instr is not None and instr.opcode == "COPY":
+            src = instr.operands[0]
+            if type(src) is not int:
+                return "list" if isinstance(src.value, list) else "scalar"
+            instr = self.defs[src]
+        if instr is not None and (
+            instr.opcode in ("STAT", "CONST") or (instr.opcode == "FUSED" and instr.fields[4] is not None)
+        ):
+            return "scalar"
+        return "list"
+
+    # -----------------------------
+    # Def-use chain updates
+    # -----------------------------
+    def is_temp(self, reg):
+        return is_temp(self.names[reg])
+
+    def used(self, reg):
+        """True while an instruction that is not removed reads reg"""
+        for instr in self.uses[reg]:
+            if not instr.removed:
+                return True
+        return False
+
+    def remove(self, instr):
+        """Drop instr; returns the registers that lost a use"""
+        instr.removed = True
+        return [op for op in instr.operands if type(op) is int]
+
+    def replace_uses(self, old, new, allowed=None):
+        """Make the uses of register old (for which allowed(instr) holds) read new"""
+        kept = []
+        moved = self.uses[new]
+        for instr in self.uses[old]:
+            if instr.removed or (allowed is not None and not allowed(instr)):
+                kept.append(instr)
+                continue
+            operands = instr.operands
+            operands[operands.index(old)] = new
+            instr.changed = True
+            moved.append(instr)
+        self.uses[old] = kept
+
+    def forward(self, instr):
+        """
+        Remove instr, whose result is the value of its operand under the
+        same name (SORT of a sorted list, list x = x): its uses read the
+        operand, which the name now holds until the next assignment.
+        """
+        src = instr.operands[0]
+        self.remove(instr)
+        self.replace_uses(instr.dest, src)
+        self.killed[src] = self.killed[instr.dest]
+
+    def fold(self, instr, value):
+        """
+        Make instr define its register as a value computed at compile
+        time: ('LIST', name, value) for a list, ('CONST', name, value) for
+        a scalar. Its operands lose the use.
+        """
+        self._drop_operands(instr)
+        instr.opcode = "LIST" if isinstance(value, list) else "CONST"
+        instr.operands = [Const(value)]
+        instr.fields = (instr.opcode, self.names[instr.dest], value)
+        instr.changed = False
+
+    def make_copy(self, instr, src):
+        """Make instr ('COPY', its name, src's name): it computes the value of register src"""
+        self._drop_operands(instr)
+        instr.opcode = "COPY"
+        instr.operands = [src]
+        instr.fields = ("COPY", self.names[instr.dest], self.names[src])
+        instr.changed = True  # checked by to_tac: src must still be held
+        self.uses[src].append(instr)
+
+    def rewrite(self, instr, fields):
+        """
+        Give instr the opcode and attributes of the TAC tuple fields; its
+        dest and operands stay (the opcode must have the same LAYOUT)
+        """
+        instr.opcode = fields[0]
+        instr.fields = fields
+        instr.changed = True  # operand names are filled in by lower()
+
+    def _drop_operands(self, instr):
+        for op in instr.operands:
+            if type(op) is int:
+                self.uses[op].remove(instr)
+
+    # -----------------------------
+    # Back to TAC
+    # -----------------------------
+    def to_tac(self):
+        """TAC of the remaining instructions"""
+        return [
+            self.lower(instr) if instr.changed else instr.fields
+            for instr in self.instrs if not instr.removed
+        ]
+
+    def lower(self, instr):
+        """
+        TAC tuple of instr with its current operands. Each register is read
+        under its name, so passes may only move a use to a register whose
+        name still holds it there: after its definition, up to killed[reg]
+        (an instruction reads its operands before it writes).
+        """
+        if not instr.changed:
+            return instr.fields
+        names, defs, killed = self.names, self.defs, self.killed
+        dest_pos, operand_pos = LAYOUT[instr.opcode]
+        fields = list(instr.fields)
+        for pos, op in zip(operand_pos, instr.operands):
+            if type(op) is not int:
+                fields[pos] = op.value
+                continue
+            definition = defs[op]
+            if not (definition is None or definition.index < instr.index <= killed[op]):
+                raise Exception(f"SSA: r{op} is not held by '{names[op]}' at {instr!r}")
+            fields[pos] = names[op]
+        if dest_pos in operand_pos and fields[dest_pos] != names[instr.dest]:
+            raise Exception(f"SSA: {instr.opcode} of '{fields[dest_pos]}' as '{names[instr.dest]}'")
+        return tuple(fields)
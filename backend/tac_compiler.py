@@ -0,0 +1,365 @@
+import bisect
+import math
+import sys
+
+from code_executer import EXECUTOR_BACKENDS, Executor, common_dtype
+from liveness import analyze_liveness
+from map_expressions import MAX_EXPR_NESTING, SAFE_GLOBALS, expr_nesting, map_order, sorted_order
+from predicates import predicate_code
+
+# File name of generated code in tracebacks
+NATIVE_FILENAME = "<lql-native>"
+
+# TAC instructions per generated function. CPython compiles a function
+# with many locals and comprehensions in superlinear time, so long
+# programs are split into chunks passing their values through memory.
+CHUNK_SIZE = 200
+
+
+class NativeProgram:
+    """A TAC program compiled into one Python function"""
+
+    def __init__(self, source, function, instr_lines):
+        self.source = source            # generated Python source
+        self.function = function        # lql_program(ex, K, memory)
+        self.consts = []                # K: constants too large to inline
+        self.instr_lines = instr_lines  # first source line of each instruction
+
+    def instruction_at(self, line):
+        """Index of the TAC instruction whose code contains source line"""
+        return bisect.bisect_right(self.instr_lines, line) - 1
+
+
+class TACCompiler:
+    """
+    Generates the Python source of one function running a whole TAC
+    program on the list backend:
+
+        ('FILTER', 't1', 'd', '>', 3.0)   →   v_t1 = [x for x in v_d if x > 3.0]
+        ('STAT', 't2', 'sum', 't1')       →   v_t2 = sum(v_t1)
+        ('PRINT', 't2')                   →   emit(v_t2)
+
+    Every variable/temp is a local (v_<name>). Sort order is known
+    statically (the program is straight-line), so SORTs of sorted lists
+    are dropped and sorted lists are filtered with ex.filter_sorted.
+    Unshared lists are sorted in place (Liveness.in_place).
+    Anything that is not a plain comprehension or builtin (set operations,
+    element-wise ops, most statistics, fused pipelines) is a direct call
+    to the Executor hook, so results and errors are the same as Executor.
+    Values are deleted after their last use (see Liveness.release).
+    MAPs over lists statically known to hold ints (types, from
+    Optimizer.types) skip the int() conversion.
+    """
+
+    def __init__(self, tac, liveness=None, types=None):
+        self.tac = tac
+        self.liveness = liveness or analyze_liveness(tac)
+        self.types = types or {}
+        self.lines = []
+        self.consts = []
+        self.order = {}    # name -> 'asc' / 'desc' known at this point
+        self.scalars = set()  # names holding STAT results
+        self.assigned = []    # names assigned by the current chunk, in order
+        self.defined = set()  # names assigned so far
+        self.used = set()     # names referenced by the current chunk
+        self.stored = set()   # names held by memory (m) at this point
+        self.index = 0        # index of the instruction being compiled
+
+    def compile(self):
+        """Build, compile() and return the NativeProgram"""
+        source_lines = []
+        instr_lines = []
+        chunks = []
+
+        for start in range(0, len(self.tac), CHUNK_SIZE):
+            # Chunk body first: its header loads what it reads from earlier chunks
+            defined_before = set(self.defined)
+            self.lines, self.assigned, self.used = [], [], set()
+            self.freed_values = 0
+            body_lines = []
+            for i in range(start, min(start + CHUNK_SIZE, len(self.tac))):
+                body_lines.append(len(self.lines))
+                self.lines.append(f"    # {self.tac[i]!r}"[:200])
+                self.index = i
+                self.emit_instr(self.tac[i])
+                if self.liveness.release[i]:
+                    self.emit_release(self.liveness.release[i])
+
+            name = f"lql_chunk_{len(chunks)}"
+            chunks.append(name)
+            header = [f"def {name}(ex, K, m):", "    emit = ex.emit", "    freed = 0"]
+            header += [f"    {self.var(n)} = m[{n!r}]" for n in sorted(self.used & defined_before)]
+
+            offset = len(source_lines) + len(header) + 1  # 1-based line numbers
+            instr_lines += [offset + line for line in body_lines]
+            live = [n for n in dict.fromkeys(self.assigned) if n in self.defined]
+            self.stored.update(live)
+            stores = ", ".join(f"{n!r}: {self.var(n)}" for n in live)
+            source_lines += header + self.lines + [
+                f"    m.update({{{stores}}})",
+                f"    ex.freed_values += {self.freed_values}",
+                "    ex.freed_elements += freed",
+                "",
+            ]
+
+        source_lines.append("def lql_program(ex, K, m):")
+        source_lines += [f"    {name}(ex, K, m)" for name in chunks] or ["    pass"]
+        source = "\n".join(source_lines) + "\n"
+        namespace = dict(SAFE_GLOBALS, len=len, sum=sum, sorted=sorted, map=map, Exception=Exception,
+                         isfinite=math.isfinite, inf=math.inf, nan=math.nan)  # repr of non-finite floats
+        exec(compile(source, NATIVE_FILENAME, "exec"), namespace)
+
+        program = NativeProgram(source, namespace["lql_program"], instr_lines)
+        program.consts = self.consts
+        return program
+
+    # ---------- Helpers ----------
+
+    def var(self, name):
+        self.used.add(name)
+        return f"v_{name}"
+
+    def const(self, value):
+        """Source text of a constant: inline number/string or K[i]"""
+        if isinstance(value, (int, float, str, type(None))):
+            return repr(value)
+        self.consts.append(value)
+        return f"K[{len(self.consts) - 1}]"
+
+    def list_ref(self, name):
+        """Source text of get_list(name)"""
+        if name not in self.defined:
+            # Not assigned by this program: same lookup (and error) as Executor
+            return f"ex.get_list({name!r})"
+        if name in self.scalars:
+            return f"[{self.var(name)}]"
+        return self.var(name)
+
+    def operand(self, value):
+        """Source text of get_operand(value)"""
+        if isinstance(value, str):
+            return self.var(value) if value in self.defined else f"ex.get_operand({value!r})"
+        return self.const(value)
+
+    def value_ref(self, name):
+        """Source text of memory[name]"""
+        return self.var(name) if name in self.defined else f"ex.memory[{name!r}]"
+
+    def assign(self, dest, expr, order=None):
+        self.lines.append(f"    {self.var(dest)} = {expr}")
+        self.define(dest)
+        if order:
+            self.order[dest] = order
+        else:
+            self.order.pop(dest, None)
+
+    def define(self, dest):
+        self.assigned.append(dest)
+        self.defined.add(dest)
+        self.scalars.discard(dest)
+
+    def emit_release(self, dead):
+        """Delete the (name, owner) pairs never read again"""
+        for name, owner in dead:
+            if name not in self.defined:
+                # Never assigned here: only memory can hold it
+                self.lines.append(f"    m.pop({name!r}, None)")
+                continue
+            if owner:
+                self.freed_values += 1
+                if name not in self.scalars:
+                    self.lines.append(f"    freed += len({self.var(name)})")
+            self.lines.append(f"    del {self.var(name)}")
+            if name in self.stored:
+                self.lines.append(f"    m.pop({name!r}, None)")
+                self.stored.discard(name)
+            self.defined.discard(name)
+            self.scalars.discard(name)
+            self.order.pop(name, None)
+
+    # ---------- Instructions ----------
+
+    def emit_instr(self, instr):
+        opcode = instr[0]
+
+        if opcode in ("LIST", "COPY"):
+            _, dest, source = instr
+            if isinstance(source, str):
+                scalar = source in self.scalars
+                self.assign(dest, self.value_ref(source), self.order.get(source))
+                if scalar:
+                    self.scalars.add(dest)
+            elif isinstance(source, list):
+                self.assign(dest, self.const(source), sorted_order(source))
+            elif isinstance(source, (int, float)):
+                self.assign(dest, self.const([source]), "asc")
+            else:
+                raise Exception(f"Invalid {opcode} source: {source}")
+
+        elif opcode == "CONST":
+            _, dest, value = instr
+            self.assign(dest, self.const(value))
+            self.scalars.add(dest)
+
+        elif opcode == "FILTER":
+            _, dest, src, op, value = instr
+            order = self.order.get(src)
+            test = predicate_code(op, value)  # raises for an invalid operator
+            if order:
+                expr = f"ex.filter_sorted({self.list_ref(src)}, {op!r}, {self.const(value)}, {order!r})"
+            else:
+                expr = f"[x for x in {self.list_ref(src)} if {test}]"
+            self.assign(dest, expr, order)
+
+        elif opcode == "SORT":
+            _, name, order = instr
+            if self.order.get(name) == order:
+                return  # already sorted
+            reverse = ", reverse=True" if order == "desc" else ""
+            if (self.liveness.in_place.get(self.index) == "owned"
+                    and name in self.defined and name not in self.scalars):
+                # Nobody else holds the list: sort it without a copy
+                self.lines.append(f"    {self.var(name)}.sort({reverse[2:]})")
+                self.define(name)
+                self.order[name] = order
+            else:
+                self.assign(name, f"sorted({self.list_ref(name)}{reverse})", order)
+
+        elif opcode == "MAP":
+            _, dest, src, expr_code = instr
+            if expr_nesting(expr_code) > MAX_EXPR_NESTING:
+                # Too deep to inline into the program's source
+                self.lines.append(f"    {self.var(dest)} = ex.map_values({self.list_ref(src)}, {expr_code!r})")
+            else:
+                # Any failure is re-run through map_values for its exact message
+                self.lines.append("    try:")
+                if common_dtype(self.types, src) == "int":
+                    source = self.list_ref(src)
+                else:
+                    source = f"map(int, {self.list_ref(src)})"
+                self.lines.append(f"        {self.var(dest)} = [{expr_code} for x in {source}]")
+                self.lines.append("    except Exception:")
+                self.lines.append(f"        {self.var(dest)} = ex.map_values({self.list_ref(src)}, {expr_code!r})")
+            self.define(dest)
+            order = map_order(expr_code, self.order.get(src))
+            if order:
+                self.order[dest] = order
+            else:
+                self.order.pop(dest, None)
+
+        elif opcode == "STAT":
+            _, dest, func, src, *args = instr
+            lst = self.list_ref(src)
+            if func == "count":
+                expr = f"len({lst})"
+            elif func == "sum":
+                expr = f"sum({lst})"
+            else:
+                arg = args[0] if args else None
+                expr = f"ex.compute_stat({func!r}, {lst}, {arg!r}, {self.order.get(src)!r})"
+            self.assign(dest, expr)
+            self.scalars.add(dest)
+
+        elif opcode == "STATS":
+            _, dests, funcs, src = instr
+            targets = ", ".join(self.var(dest) for dest in dests)
+            self.lines.append(
+                f"    {targets}, = ex.compute_stats({self.const(funcs)}, {self.list_ref(src)}, {self.order.get(src)!r})"
+            )
+            for dest in dests:
+                self.define(dest)
+                self.order.pop(dest, None)
+                self.scalars.add(dest)
+
+        elif opcode == "SETOP":
+            _, dest, op, left, right = instr
+            operands = []
+            for side, value in (("left", left), ("right", right)):
+                if isinstance(value, str):
+                    operands.append(self.list_ref(value))
+                elif isinstance(value, list):
+                    operands.append(self.const(value))
+                else:
+                    raise Exception(f"Invalid SETOP {side} operand: {value}")
+            self.assign(dest, f"ex.set_operation({op!r}, {operands[0]}, {operands[1]})")
+
+        elif opcode == "LISTOP":
+            _, dest, op, left, right = instr
+            dtype = common_dtype(self.types, left, right)
+            self.assign(dest, f"ex.element_wise_op({op!r}, {self.operand(left)}, {self.operand(right)}, {dtype!r})")
+
+        elif opcode == "FUSED":
+            _, dest, src, stages, func = instr
+            order = self.order.get(src) if func is None else None
+            for stage in stages:
+                if stage[0] == "MAP":
+                    order = map_order(stage[1], order)
+            self.assign(dest, f"ex.run_pipeline({self.list_ref(src)}, {self.const(stages)}, {func!r})", order)
+            if func is not None:
+                self.scalars.add(dest)
+
+        elif opcode == "PRINT":
+            if instr[1] in self.defined:
+                self.lines.append(f"    emit({self.var(instr[1])})")
+            else:
+                self.lines.append(f"    ex.exec_print({instr!r})")
+
+        else:
+            raise Exception(f"Unknown opcode: {opcode}")
+
+
+def compile_tac(tac, liveness=None, types=None):
+    """Compile optimized TAC into a NativeProgram"""
+    return TACCompiler(tac, liveness, types).compile()
+
+
+class NativeExecutor(Executor):
+    """
+    Runs a TAC program as one generated Python function (see TACCompiler).
+
+    The function is built by build_program(); run_lql keeps it with the
+    cached program (program_key), so repeated programs run without any
+    per-instruction dispatch. Only the list storage is supported: FILTER
+    and MAP are inlined as list comprehensions.
+    """
+
+    program_key = "native"
+
+    def __init__(self, tac, symbol_table=None, output=None):
+        super().__init__(tac, symbol_table, output)
+        self.program = None
+
+    def build_program(self):
+        return compile_tac(self.tac, self.get_liveness(), self.types)
+
+    def run(self):
+        """Execute the compiled program"""
+        if self.profiler is not None:
+            # EXPLAIN ANALYZE profiles TAC instructions
+            return super().run()
+
+        if self.program is None:
+            self.program = self.build_program()
+
+        try:
+            # Chunks store their values in memory as they finish
+            self.program.function(self, self.program.consts, self.memory)
+        except Exception:
+            self.executed = self.failed_instruction(sys.exc_info()[2])
+            raise
+
+        self.executed = len(self.tac)
+        return self.memory
+
+    def failed_instruction(self, tb):
+        """Index of the instruction that raised, from the generated code's frame"""
+        line = None
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == NATIVE_FILENAME:
+                line = tb.tb_lineno
+            tb = tb.tb_next
+        return 0 if line is None else self.program.instruction_at(line)
+
+
+# Selectable through create_executor(..., backend="native")
+EXECUTOR_BACKENDS["native"] = NativeExecutor
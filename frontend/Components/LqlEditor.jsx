@@ -18,6 +18,8 @@ const customSyntaxHighlighter = (monaco) => {
       "mean",
       "sum",
       "median",
+      "percentile",
+      "quantile",
       "variance",
       "std",
       "min",
@@ -26,6 +28,7 @@ const customSyntaxHighlighter = (monaco) => {
       "union",
       "intersection",
       "difference",
+      "between",
     ],
 
     operators: [
@@ -52,7 +55,7 @@ const customSyntaxHighlighter = (monaco) => {
 
         // --- Keywords ---
         [
-          /\b(list|filter|sort|asc|desc|map|print|mean|sum|median|variance|std|min|max|count|union|intersection|difference)\b/,
+          /\b(list|filter|sort|asc|desc|map|print|mean|sum|median|percentile|quantile|variance|std|min|max|count|union|intersection|difference|between)\b/,
           "keyword",
         ],
 